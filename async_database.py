@@ -0,0 +1,81 @@
+"""
+Async version of the database.py API.
+
+The supabase client is synchronous, so every call here runs on a bounded
+thread pool (DB_MAX_CONCURRENCY). A slow query then only occupies one pool
+thread instead of stalling the event loop - and with it every concurrent
+request and the scraper. Signatures, return values and error handling match
+database.py.
+"""
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import database
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=config.DB_MAX_CONCURRENCY, thread_name_prefix="db")
+
+
+async def run(fn, *args, **kwargs):
+    """Run a blocking database call on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+def _wrap(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run(fn, *args, **kwargs)
+    return wrapper
+
+
+def shutdown():
+    """Let in-flight queries finish and stop the pool (called from main.lifespan)."""
+    _executor.shutdown(wait=True)
+
+
+# Scraper state
+get_scraper_state = _wrap(database.get_scraper_state)
+set_scraper_state = _wrap(database.set_scraper_state)
+
+# Insights
+insight_exists = _wrap(database.insight_exists)
+save_insight = _wrap(database.save_insight)
+save_insights = _wrap(database.save_insights)
+get_news = _wrap(database.get_news)
+get_latest_news_per_token = _wrap(database.get_latest_news_per_token)
+search_insights = _wrap(database.search_insights)
+get_insights_created_after = _wrap(database.get_insights_created_after)
+
+# Tokens
+get_all_tokens = _wrap(database.get_all_tokens)
+get_tokens_due_for_scrape = _wrap(database.get_tokens_due_for_scrape)
+update_token_last_scraped = _wrap(database.update_token_last_scraped)
+get_token_daily_stats = _wrap(database.get_token_daily_stats)
+add_token = _wrap(database.add_token)
+delete_token = _wrap(database.delete_token)
+toggle_token = _wrap(database.toggle_token)
+
+# Users
+upsert_user = _wrap(database.upsert_user)
+get_user = _wrap(database.get_user)
+
+# API keys
+create_api_key = _wrap(database.create_api_key)
+get_user_api_keys = _wrap(database.get_user_api_keys)
+revoke_api_key = _wrap(database.revoke_api_key)
+validate_api_key = _wrap(database.validate_api_key)
+
+# Credits, usage & payments
+get_user_credits = _wrap(database.get_user_credits)
+deduct_credit = _wrap(database.deduct_credit)
+lease_credits = _wrap(database.lease_credits)
+log_api_usage_batch = _wrap(database.log_api_usage_batch)
+get_user_usage_stats = _wrap(database.get_user_usage_stats)
+prune_usage_logs = _wrap(database.prune_usage_logs)
+add_credits = _wrap(database.add_credits)
+verify_payment_transaction = _wrap(database.verify_payment_transaction)
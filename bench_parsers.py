@@ -0,0 +1,63 @@
+"""
+Micro-benchmark for the insight page parser backends.
+
+Checks that every backend produces byte-identical output on the recorded
+fixture pages, then reports pages parsed per second for each.
+
+    python bench_parsers.py [iterations]
+"""
+import json
+import sys
+import time
+from pathlib import Path
+
+from parsers import BACKENDS, get_parser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "insights"
+
+
+def load_fixtures():
+    """(token_id, timestamp, html) for every recorded insight page."""
+    pages = []
+    for path in sorted(FIXTURE_DIR.glob("*.html")):
+        token_id, timestamp = path.stem.rsplit("_", 1)
+        pages.append((token_id, int(timestamp), path.read_text(encoding="utf-8")))
+    return pages
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    pages = load_fixtures()
+    if not pages:
+        print(f"No fixtures found in {FIXTURE_DIR}")
+        return 1
+
+    parsers = [get_parser(name) for name in BACKENDS]
+
+    # 1. Output must be byte-identical across backends
+    reference = None
+    for parser in parsers:
+        output = json.dumps([parser.parse(html, token_id, ts) for token_id, ts, html in pages], sort_keys=True)
+        if reference is None:
+            reference = (parser.name, output)
+        elif output != reference[1]:
+            print(f"FAIL: {parser.name} output differs from {reference[0]}")
+            return 1
+    insights = sum(len(p) for p in json.loads(reference[1]))
+    print(f"PASS: {len(parsers)} backends agree on {len(pages)} pages ({insights} insights)")
+
+    # 2. Throughput
+    for parser in parsers:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for token_id, ts, html in pages:
+                parser.parse(html, token_id, ts)
+        elapsed = time.perf_counter() - start
+        parsed = iterations * len(pages)
+        print(f"{parser.name:>6}: {parsed / elapsed:8.1f} pages/s ({elapsed * 1000 / parsed:.2f} ms/page)")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
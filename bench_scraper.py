@@ -0,0 +1,79 @@
+"""
+End-to-end scraper benchmark on the offline replay harness (replay.py).
+
+Runs ScraperOrchestrator over 1, 10 and 500 tokens against recorded pages
+and an in-memory database, twice per size: a cold run (everything new) and
+a steady-state run (high-water marks already set). Reports tokens/min,
+insights/sec, parse time, fetches and DB call counts.
+
+    python bench_scraper.py [--workers N] [--sizes 1,10,500] [--page-cache DIR]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from replay import Recording, Replay
+
+
+def run(recording: Recording, tokens: int, workers: int):
+    rows = []
+    with Replay(recording, token_count=tokens, workers=workers) as replay:
+        for phase in ("cold", "steady"):
+            counts_before = dict(replay.server.counts)
+            calls_before = sum(replay.db.calls.values())
+            trips_before = replay.db.round_trips
+            insights_before = len(replay.db.insights)
+            parse_before = replay.parse_timer.seconds
+
+            start = time.perf_counter()
+            asyncio.run(replay.orchestrator().run_all_due_tokens())
+            elapsed = time.perf_counter() - start
+
+            fetches = sum(
+                replay.server.counts[k] - counts_before.get(k, 0)
+                for k in ("timeline_fetches", "insight_fetches")
+            )
+            inserted = len(replay.db.insights) - insights_before
+            rows.append({
+                "tokens": tokens,
+                "phase": phase,
+                "seconds": elapsed,
+                "tokens_per_min": tokens / elapsed * 60,
+                "insights_per_sec": inserted / elapsed,
+                "inserted": inserted,
+                "parse_ms": (replay.parse_timer.seconds - parse_before) * 1000,
+                "fetches": fetches,
+                "db_calls": sum(replay.db.calls.values()) - calls_before,
+                "db_round_trips": replay.db.round_trips - trips_before,
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sizes", default="1,10,500")
+    parser.add_argument("--page-cache", help="replay a page cache recorded by a live run instead of fixtures")
+    args = parser.parse_args()
+
+    # The scraper logs every page; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    recording = Recording.from_page_cache(args.page_cache) if args.page_cache else Recording.from_fixtures()
+    print(f"Recording: {len(recording.tokens)} tokens, "
+          f"{sum(len(p) for p in recording.pages.values())} insight pages; {args.workers} workers\n")
+
+    header = f"{'tokens':>6} {'phase':>6} {'secs':>7} {'tokens/min':>11} {'insights/s':>11} " \
+             f"{'new':>6} {'parse ms':>9} {'fetches':>8} {'db calls':>9} {'db trips':>9}"
+    print(header)
+    print("-" * len(header))
+    for size in (int(s) for s in args.sizes.split(",")):
+        for row in run(recording, size, args.workers):
+            print(f"{row['tokens']:>6} {row['phase']:>6} {row['seconds']:>7.2f} {row['tokens_per_min']:>11.0f} "
+                  f"{row['insights_per_sec']:>11.0f} {row['inserted']:>6} {row['parse_ms']:>9.1f} "
+                  f"{row['fetches']:>8} {row['db_calls']:>9} {row['db_round_trips']:>9}")
+
+
+if __name__ == "__main__":
+    main()
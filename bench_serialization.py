@@ -0,0 +1,107 @@
+"""
+Benchmark for /news response encoding at limit=20/200/1000.
+
+Drives an in-process ASGI app (no network) with real insight rows parsed
+from the fixtures, and compares:
+
+    jsonable    plain list through jsonable_encoder + stdlib json (the old path)
+    model       response_model=List[Insight] (pydantic validation + dump)
+    dumps       serialization.dumps per request (a /news cache miss)
+    cached      pre-encoded bytes (a /news cache hit)
+
+Reports requests/sec and CPU milliseconds per response.
+
+    python bench_serialization.py [--requests N] [--limits 20,200,1000]
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import List
+
+# main.py -> database.py insists on credentials at import; nothing here talks to Supabase
+os.environ.setdefault("SUPABASE_URL", "http://bench.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "bench")
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from bench_parsers import load_fixtures
+from main import Insight
+from parsers import get_parser
+from serialization import dumps, orjson, raw_json
+
+
+def sample_rows(count: int) -> List[dict]:
+    """`count` insight rows cycled from the parsed fixture pages, with unique ids."""
+    parser = get_parser()
+    parsed = [row for token_id, ts, html in load_fixtures() for row in parser.parse(html, token_id, ts)]
+    rows = []
+    for i, row in zip(range(count), itertools.cycle(parsed)):
+        rows.append({**row, "id": f"{row['id']}-{i}", "created_at": "2026-01-01T00:00:00+00:00"})
+    return rows
+
+
+def build_app(rows: List[dict]) -> FastAPI:
+    app = FastAPI()
+    body = dumps(rows)
+
+    @app.get("/jsonable", response_class=JSONResponse)
+    async def jsonable():
+        return rows
+
+    @app.get("/model", response_model=List[Insight])
+    async def model():
+        return rows
+
+    @app.get("/dumps")
+    async def encoded():
+        return raw_json(dumps(rows))
+
+    @app.get("/cached")
+    async def cached():
+        return raw_json(body)
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int):
+    await client.get(path)  # warm up
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(requests):
+        response = await client.get(path)
+        response.raise_for_status()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    return requests / wall, cpu * 1000 / requests, len(response.content)
+
+
+async def run(limits: List[int], requests: int):
+    print(f"orjson: {'yes' if orjson else 'no (stdlib json)'}; {requests} requests per cell\n")
+    header = f"{'limit':>6} {'variant':>9} {'req/s':>8} {'cpu ms':>8} {'bytes':>9}"
+    print(header)
+    print("-" * len(header))
+    for limit in limits:
+        app = build_app(sample_rows(limit))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for variant in ("jsonable", "model", "dumps", "cached"):
+                rps, cpu_ms, size = await measure(client, f"/{variant}", requests)
+                print(f"{limit:>6} {variant:>9} {rps:>8.0f} {cpu_ms:>8.2f} {size:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limits", default="20,200,1000")
+    args = parser.parse_args()
+
+    # httpx logs every request; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(run([int(n) for n in args.limits.split(",")], args.requests))
+
+
+if __name__ == "__main__":
+    main()
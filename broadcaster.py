@@ -0,0 +1,113 @@
+"""
+In-process fan-out of newly saved insights to streaming clients (/news/stream).
+
+TokenScraper publishes each batch of new rows once; every row is encoded to
+an SSE frame once and handed to the subscribers of its token (and to the
+unfiltered ones). Each client has a bounded queue - a client that falls
+STREAM_QUEUE_SIZE events behind is dropped instead of buffering without limit
+or slowing the scraper down.
+"""
+import asyncio
+import json
+import logging
+from typing import Dict, Iterable, List, Optional, Set
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Queued to a subscriber to end its stream (dropped or shutting down)
+CLOSED = None
+
+
+class StreamFull(Exception):
+    """Raised by subscribe when STREAM_MAX_CLIENTS are already connected."""
+
+
+class Subscriber:
+    def __init__(self, token_ids: Optional[Set[str]]):
+        self.token_ids = token_ids  # None = every token
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=config.STREAM_QUEUE_SIZE)
+        self.dropped = False
+
+    def close(self):
+        """End the stream after what is queued, or right away if the queue is full."""
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+        self.queue.put_nowait(CLOSED)
+
+
+def encode_event(row: Dict) -> str:
+    return f"event: insight\ndata: {json.dumps(row, separators=(',', ':'), default=str)}\n\n"
+
+
+class NewsBroadcaster:
+    """Subscribers indexed by token so a publish only touches interested clients."""
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.by_token: Dict[str, Set[Subscriber]] = {}
+        self.firehose: Set[Subscriber] = set()
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, token_ids: Optional[Iterable[str]] = None) -> Subscriber:
+        if len(self.subscribers) >= config.STREAM_MAX_CLIENTS:
+            raise StreamFull(f"{config.STREAM_MAX_CLIENTS} stream clients already connected")
+        subscriber = Subscriber(set(token_ids) if token_ids else None)
+        self.subscribers.add(subscriber)
+        if subscriber.token_ids is None:
+            self.firehose.add(subscriber)
+        else:
+            for token_id in subscriber.token_ids:
+                self.by_token.setdefault(token_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        self.firehose.discard(subscriber)
+        for token_id in subscriber.token_ids or ():
+            subs = self.by_token.get(token_id)
+            if subs is not None:
+                subs.discard(subscriber)
+                if not subs:
+                    del self.by_token[token_id]
+
+    def publish(self, rows: List[Dict]):
+        """Queue new insight rows to their subscribers. Never blocks."""
+        for row in rows:
+            frame = encode_event(row)
+            self.published += 1
+            for subscriber in (*self.firehose, *self.by_token.get(row.get("token_id"), ())):
+                try:
+                    subscriber.queue.put_nowait(frame)
+                    self.delivered += 1
+                except asyncio.QueueFull:
+                    self._drop(subscriber)
+
+    def _drop(self, subscriber: Subscriber):
+        logger.warning(f"Dropping slow stream client (token filter: {subscriber.token_ids or 'all'})")
+        subscriber.dropped = True
+        self.dropped += 1
+        self.unsubscribe(subscriber)
+        subscriber.close()
+
+    def close(self):
+        """End every open stream (called from main.lifespan on shutdown)."""
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+            subscriber.close()
+
+    def stats(self) -> Dict:
+        return {
+            "clients": len(self.subscribers),
+            "filtered_tokens": len(self.by_token),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_clients": self.dropped,
+        }
+
+
+news_broadcaster = NewsBroadcaster()
@@ -0,0 +1,170 @@
+"""
+In-process caches for the API read path.
+"""
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import config
+
+# Returned by TTLCache.get on a miss, so None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with a per-entry TTL and hit/miss counters. With `maxbytes`,
+    entries are also evicted to keep the sum of sizeof(value) under it (values
+    larger than the whole budget are not cached).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, maxbytes: Optional[int] = None,
+                 sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (expires, value, size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._pop(key)
+            self.misses += 1
+            return MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._pop(key)
+        size = self.sizeof(value) if self.sizeof else 0
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, size)
+        self.bytes += size
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+            self._pop(next(iter(self._data)))
+            self.evictions += 1
+
+    def _pop(self, key: Hashable):
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def delete(self, key: Hashable):
+        self._pop(key)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every entry whose key matches. Returns how many were dropped."""
+        stale = [key for key in self._data if predicate(key)]
+        for key in stale:
+            self._pop(key)
+        return len(stale)
+
+    def invalidate_values(self, predicate: Callable[[Any], bool]) -> int:
+        """Drop every entry whose value matches. Returns how many were dropped."""
+        return self.invalidate(lambda key: predicate(self._data[key][1]))
+
+    def clear(self):
+        self._data.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "maxbytes": self.maxbytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+
+# /news pages keyed by (token_id, limit, offset, cursor, fields); token_id None = all tokens.
+# Values are (encoded body, next_cursor, etag); the byte budget counts the bodies, since
+# clients choose limit/offset/cursor and a count bound alone allows 2048 pages of 1000 rows
+news_cache = TTLCache(
+    maxsize=config.NEWS_CACHE_SIZE,
+    ttl=config.NEWS_CACHE_TTL,
+    maxbytes=config.NEWS_CACHE_MAX_MB * 1024 * 1024,
+    sizeof=lambda page: len(page[0]),
+)
+
+
+def invalidate_token_news(token_id: str) -> int:
+    """Drop cached /news pages that can contain this token's insights."""
+    return news_cache.invalidate(lambda key: key[0] in (token_id, None))
+
+
+# The /tokens response as (encoded body, ETag). Dropped on registry changes and scraper
+# writes in this process; the TTL bounds staleness from other replicas
+tokens_cache = TTLCache(maxsize=1, ttl=config.TOKENS_CACHE_TTL)
+TOKENS_KEY = "tokens"
+
+
+def invalidate_tokens():
+    tokens_cache.delete(TOKENS_KEY)
+
+
+# API key hash -> {id, user_address, is_active}; unknown/revoked hashes are kept apart
+# so a flood of bad keys can't evict valid ones
+api_key_cache = TTLCache(maxsize=config.API_KEY_CACHE_SIZE, ttl=config.API_KEY_CACHE_TTL)
+invalid_api_key_cache = TTLCache(maxsize=config.API_KEY_CACHE_SIZE, ttl=config.API_KEY_NEGATIVE_TTL)
+
+
+def forget_api_key(key_id: str) -> int:
+    """Drop a revoked key from the cache."""
+    return api_key_cache.invalidate_values(lambda key_data: key_data["id"] == key_id)
+
+
+# -------------------------------------------------------------------
+# ETags
+# -------------------------------------------------------------------
+# All tags are weak (W/"..."): the compression middleware re-encodes bodies without
+# touching the ETag, and a strong validator would have to differ per content-coding
+def _etag(*parts) -> str:
+    digest = hashlib.sha1(json.dumps(parts, separators=(",", ":"), default=str).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def news_etag(key: tuple, rows: list) -> str:
+    """
+    ETag for a /news page: its query key plus the newest and oldest
+    (timestamp, id) on it and the row count. Insights are never edited, so a
+    page only changes when rows enter or leave it - which moves one of those.
+    """
+    if not rows:
+        return _etag(key, 0)
+    first, last = rows[0], rows[-1]
+    return _etag(key, len(rows), first["timestamp"], first["id"], last["timestamp"], last["id"])
+
+
+def payload_etag(payload) -> str:
+    """ETag over a JSON-serializable value."""
+    return _etag(payload)
+
+
+def content_etag(body: bytes) -> str:
+    """ETag over an encoded response body."""
+    return f'W/"{hashlib.sha1(body).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 prescribes for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
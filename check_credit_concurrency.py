@@ -0,0 +1,73 @@
+"""
+Concurrency check for credit deduction against a real Supabase project.
+
+Gives a test user a known balance, fires N deductions of 1 credit from many
+threads at once, and checks that exactly min(N, balance) succeeded and the
+final balance is exact. With --legacy it runs the old read-then-write
+deduction instead, to show the lost updates the SQL functions prevent.
+
+Uses SUPABASE_URL / SUPABASE_SERVICE_ROLE_KEY from .env. Point it at a test
+user only - its balance is overwritten.
+
+    python check_credit_concurrency.py 0xTEST... [--deductions 10000] [--balance 5000] [--threads 64] [--legacy]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from database import add_credits, deduct_credit, get_user_credits, supabase, upsert_user
+
+
+def legacy_deduct(user_address: str, amount: int = 1) -> bool:
+    """The pre-RPC implementation: read the balance, then write balance - amount."""
+    current = get_user_credits(user_address)
+    if current < amount:
+        return False
+    supabase.table("credits").update({"balance": current - amount}).eq("user_address", user_address.lower()).execute()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("user_address")
+    parser.add_argument("--deductions", type=int, default=10000)
+    parser.add_argument("--balance", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=64)
+    parser.add_argument("--legacy", action="store_true", help="use the old read-then-write deduction")
+    args = parser.parse_args()
+
+    user = args.user_address.lower()
+    if not upsert_user(user):
+        print("Could not create the test user")
+        return 1
+    supabase.table("credits").update({"balance": 0}).eq("user_address", user).execute()
+    if args.balance and not add_credits(user, args.balance):
+        print("Could not set the starting balance")
+        return 1
+    start_balance = get_user_credits(user)
+    deduct = legacy_deduct if args.legacy else deduct_credit
+
+    print(f"{'legacy read-then-write' if args.legacy else 'deduct_credits rpc'}: "
+          f"{args.deductions} deductions on {args.threads} threads, starting balance {start_balance}")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(lambda _: deduct(user, 1), range(args.deductions)))
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(results)
+    final_balance = get_user_credits(user)
+    expected_succeeded = min(args.deductions, start_balance)
+    print(f"{elapsed:.1f}s ({args.deductions / elapsed:.0f} deductions/s)")
+    print(f"succeeded: {succeeded} (expected {expected_succeeded})")
+    print(f"final balance: {final_balance} (expected {start_balance - succeeded})")
+
+    if succeeded == expected_succeeded and final_balance == start_balance - succeeded:
+        print("PASS: balance is exact")
+        return 0
+    print(f"FAIL: {start_balance - succeeded - final_balance:+d} credits unaccounted for")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,13 +17,13 @@ SUPABASE_KEY = os.getenv("SUPABSE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_SERV
 # Scraper Settings (Conservative for proxy-free)
 # -------------------------------------------------------------------
 MAX_CONCURRENT_WORKERS = int(os.getenv("MAX_WORKERS", "1"))  # Only 1 worker without proxies!
-TOKENS_PER_BATCH = int(os.getenv("TOKENS_PER_BATCH", "5"))   # Max tokens per scheduled run
+TOKENS_PER_BATCH = int(os.getenv("TOKENS_PER_BATCH", "5"))   # Max tokens per worker per one-off run (scraper.py CLI)
 DEFAULT_SCRAPE_INTERVAL_MINUTES = int(os.getenv("SCRAPE_INTERVAL", "60"))
+TOKEN_REFRESH_MINUTES = int(os.getenv("TOKEN_REFRESH_MINUTES", "5"))  # re-read the token registry for the scheduler
 
 # Delays (longer = safer without proxies)
-REQUEST_DELAY_MIN = 8.0   # seconds between insight page fetches
-REQUEST_DELAY_MAX = 15.0
-TOKEN_DELAY_MIN = 30.0    # seconds between different tokens (important!)
+REQUEST_DELAY_MIN = 8.0   # seconds between insight page fetches (initial adaptive pace)
+TOKEN_DELAY_MIN = 30.0    # seconds between tokens on the same proxy lane (important!)
 TOKEN_DELAY_MAX = 60.0
 PAGE_LOAD_DELAY_MIN = 3.0  # after loading main page
 PAGE_LOAD_DELAY_MAX = 6.0
@@ -33,14 +33,87 @@ RATE_LIMIT_BACKOFF_INITIAL = 60   # seconds on first 429
 RATE_LIMIT_BACKOFF_MAX = 300       # max backoff (5 min)
 RATE_LIMIT_BACKOFF_MULTIPLIER = 2  # exponential multiplier
 
+# Adaptive pacing per proxy lane (AIMD, see rate_governor.py)
+REQUEST_INTERVAL_START = REQUEST_DELAY_MIN                            # seconds between requests on a fresh lane
+REQUEST_INTERVAL_MIN = float(os.getenv("REQUEST_INTERVAL_MIN", "2"))  # fastest pace a healthy lane may reach
+REQUEST_INTERVAL_MAX = 120.0                                          # slowest pace after repeated 429s
+RATE_GOVERNOR_INCREASE = 0.01                                         # req/s added per healthy response
+
 # Error handling
 MAX_RETRIES_PER_TOKEN = 2
+PAGE_MAX_FAILURES = 3  # runs an insight page may fail to fetch before the high-water mark moves past it
 SKIP_ON_FAILURE = True  # Skip token if fails, don't crash
 
+# Fetch mode: "http" uses the browser only to set up the session, then a pooled
+# HTTP client (falls back to in-page fetch on challenges); "browser" fetches in-page
+FETCH_MODE = os.getenv("FETCH_MODE", "http")
+HTTP_TIMEOUT = 30.0  # seconds per browserless request
+
+# On-disk cache of fetched pages (set PAGE_CACHE_DIR= to disable)
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", ".cache/pages")
+PAGE_CACHE_MAX_MB = int(os.getenv("PAGE_CACHE_MAX_MB", "512"))
+PAGE_CACHE_MAX_AGE_DAYS = 30
+PAGE_CACHE_EVICT_MINUTES = 30  # how often the API process enforces the size/age limits
+TIMELINE_CACHE_TTL = 300  # seconds a cached timeline is reused instead of refetched
+INSIGHT_CACHE_TTL = 6 * 3600  # seconds a cached insight page is reused (a retry after a failed save, a re-run)
+
+# HTML parser backend for insight pages: "lxml" (fast) or "bs4" (reference)
+HTML_PARSER = os.getenv("HTML_PARSER", "lxml")
+
+# -------------------------------------------------------------------
+# API Read Path
+# -------------------------------------------------------------------
+DB_MAX_CONCURRENCY = int(os.getenv("DB_MAX_CONCURRENCY", "16"))  # threads running blocking Supabase calls
+NEWS_CACHE_SIZE = int(os.getenv("NEWS_CACHE_SIZE", "2048"))  # cached /news pages (LRU)
+NEWS_CACHE_MAX_MB = int(os.getenv("NEWS_CACHE_MAX_MB", "64"))  # memory budget for those pages
+TOKENS_CACHE_TTL = float(os.getenv("TOKENS_CACHE_TTL", "30"))  # seconds the encoded /tokens response is reused
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", "60"))    # seconds; the scraper also invalidates on write
+NEWS_MAX_LIMIT = int(os.getenv("NEWS_MAX_LIMIT", "1000"))    # page size cap for /news
+NEWS_BATCH_MAX_TOKENS = int(os.getenv("NEWS_BATCH_MAX_TOKENS", "100"))  # token_ids per /news/batch call
+NEWS_BATCH_MAX_PER_TOKEN = 50
+TOKEN_STATS_MAX_DAYS = 365  # window cap for /tokens/{id}/stats
+SEARCH_MAX_LIMIT = int(os.getenv("SEARCH_MAX_LIMIT", "100"))  # page size cap for /news/search
+# Embedded SQLite replica serving /news, /tokens and /status (set LOCAL_STORE_PATH to enable)
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", "")
+LOCAL_STORE_SYNC_MINUTES = int(os.getenv("LOCAL_STORE_SYNC_MINUTES", "5"))  # catch-up from Supabase
+LOCAL_STORE_SYNC_BATCH = 1000  # rows per catch-up query
+LOCAL_STORE_SYNC_OVERLAP_SECONDS = 120  # re-read window for rows that committed late (see LocalStore.catch_up)
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))  # smaller responses are sent uncompressed
+STREAM_MAX_CLIENTS = int(os.getenv("STREAM_MAX_CLIENTS", "5000"))  # concurrent /news/stream connections
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "256"))     # events a client may lag before it is dropped
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))  # keeps proxies from closing idle streams
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))  # a stream ends after this; clients reconnect
+STREAM_RETRY_MS = int(os.getenv("STREAM_RETRY_MS", "3000"))  # SSE reconnect delay sent to clients
+SHUTDOWN_GRACE_SECONDS = int(os.getenv("SHUTDOWN_GRACE_SECONDS", "10"))  # open connections get this long before shutdown
+
+# -------------------------------------------------------------------
+# API Keys & Billing
+# -------------------------------------------------------------------
+# API key validation cache; revocations bump an epoch in scraper_state that replicas poll
+API_KEY_CACHE_SIZE = int(os.getenv("API_KEY_CACHE_SIZE", "10000"))
+API_KEY_CACHE_TTL = float(os.getenv("API_KEY_CACHE_TTL", "300"))      # seconds a valid key is trusted
+API_KEY_NEGATIVE_TTL = float(os.getenv("API_KEY_NEGATIVE_TTL", "60"))  # seconds an invalid key is remembered
+API_KEY_EPOCH_POLL_SECONDS = int(os.getenv("API_KEY_EPOCH_POLL_SECONDS", "10"))
+# Credit leasing: each process reserves blocks of credits per user and charges locally
+CREDIT_LEASE_BLOCK = int(os.getenv("CREDIT_LEASE_BLOCK", "100"))           # credits reserved per lease call
+CREDIT_LEASE_REFILL_AT = 0.2                                               # refill in the background below this fraction
+CREDIT_LEASE_IDLE_SECONDS = int(os.getenv("CREDIT_LEASE_IDLE_SECONDS", "300"))  # unused leases are returned after this
+# Usage logging: authenticated calls are buffered in memory and inserted in batches
+USAGE_LOG_QUEUE_SIZE = int(os.getenv("USAGE_LOG_QUEUE_SIZE", "50000"))  # rows held before spilling
+USAGE_LOG_BATCH = int(os.getenv("USAGE_LOG_BATCH", "500"))               # rows per insert
+USAGE_LOG_FLUSH_MS = int(os.getenv("USAGE_LOG_FLUSH_MS", "1000"))        # max delay before a partial batch is written
+USAGE_LOG_SPILL_PATH = os.getenv("USAGE_LOG_SPILL_PATH", ".cache/usage_spill.jsonl")  # overflow file (empty: drop instead)
+USAGE_LOG_REJECTED_PATH = os.getenv("USAGE_LOG_REJECTED_PATH", ".cache/usage_rejected.jsonl")  # rows the database refused (empty: drop)
+# Raw usage_logs older than this are pruned daily (0 keeps them); daily rollups are kept
+USAGE_LOG_RETENTION_DAYS = int(os.getenv("USAGE_LOG_RETENTION_DAYS", "90"))
+USAGE_HOURLY_RETENTION_DAYS = 7  # hourly rollups only back the last-24h figure
+USAGE_PRUNE_BATCH = 50000        # rows deleted per prune call
+
 # -------------------------------------------------------------------
 # Browser Settings
 # -------------------------------------------------------------------
 HEADLESS = os.getenv("HEADLESS", "true").lower() == "true"
+CONTEXT_MAX_USES = int(os.getenv("CONTEXT_MAX_USES", "10"))  # tokens per context before it is recycled
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
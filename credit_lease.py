@@ -0,0 +1,147 @@
+"""
+Local credit leasing for per-request billing.
+
+Instead of a database write per API call, each process moves a block of a
+user's credits (CREDIT_LEASE_BLOCK) out of their balance with one atomic
+lease_credits call and charges requests against it in memory. The lease is
+topped up in the background once it drops below CREDIT_LEASE_REFILL_AT, and
+whatever is left goes back to the balance when the user has been idle for
+CREDIT_LEASE_IDLE_SECONDS or the process shuts down.
+
+Credits are taken from the balance before they are spent, so a user can never
+spend more than they have. The cost is that credits held by a process that
+crashes are lost (at most one block per active user).
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Set
+
+import config
+from async_database import add_credits, lease_credits
+
+logger = logging.getLogger(__name__)
+
+# A user whose balance was empty is not re-checked more often than this
+EMPTY_RECHECK_SECONDS = 5.0
+
+
+class Lease:
+    def __init__(self):
+        self.remaining = 0
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()  # one lease call in flight per user
+        self.exhausted = False      # the balance was empty at the last lease call
+        self.checked_at = 0.0
+        self.refill_pending = False  # a background top-up is scheduled
+
+
+class CreditLeaser:
+    def __init__(self):
+        self.leases: Dict[str, Lease] = {}
+        self._refills: Set[asyncio.Task] = set()
+        self.charges = 0
+        self.lease_calls = 0
+
+    def charge_local(self, user_address: str, amount: int = 1) -> bool:
+        """Charge from the in-memory lease only; False if it doesn't cover `amount`."""
+        lease = self.leases.get(user_address)
+        if lease is None or lease.remaining < amount:
+            return False
+        lease.remaining -= amount
+        lease.last_used = time.monotonic()
+        self.charges += 1
+        running_low = lease.remaining < config.CREDIT_LEASE_BLOCK * config.CREDIT_LEASE_REFILL_AT
+        if running_low and not lease.exhausted and not lease.refill_pending:
+            lease.refill_pending = True
+            task = asyncio.create_task(self._refill(user_address, lease))
+            self._refills.add(task)
+            task.add_done_callback(self._refills.discard)
+        return True
+
+    async def charge(self, user_address: str, amount: int = 1) -> bool:
+        """
+        Charge `amount` credits; only waits on the database when the lease runs dry.
+        False if the balance doesn't cover it; raises if the database can't be reached.
+        """
+        user_address = user_address.lower()
+        while not self.charge_local(user_address, amount):
+            lease = self.leases.setdefault(user_address, Lease())
+            if lease.exhausted and time.monotonic() - lease.checked_at < EMPTY_RECHECK_SECONDS:
+                return False
+            await self._lease(user_address, lease, at_least=amount)
+            if lease.exhausted and lease.remaining < amount:
+                return False
+        return True
+
+    async def _refill(self, user_address: str, lease: Lease):
+        try:
+            await self._lease(user_address, lease, at_least=0, background=True)
+        except Exception as e:
+            # Requests keep spending what is left; the next charge retries
+            logger.error(f"Credit lease refill failed for {user_address}: {e}")
+        finally:
+            lease.refill_pending = False
+
+    async def _lease(self, user_address: str, lease: Lease, at_least: int, background: bool = False):
+        checked_at = lease.checked_at
+        async with lease.lock:
+            if background:
+                if lease.exhausted or lease.remaining >= config.CREDIT_LEASE_BLOCK * config.CREDIT_LEASE_REFILL_AT:
+                    return
+            elif lease.remaining >= at_least or (lease.exhausted and lease.checked_at != checked_at):
+                return  # a concurrent lease call already refilled it, or found the balance empty
+            self.lease_calls += 1
+            # Raises on database errors, leaving `exhausted` as it was
+            granted = await lease_credits(user_address, max(config.CREDIT_LEASE_BLOCK, at_least))
+            lease.remaining += granted
+            lease.exhausted = granted == 0
+            lease.checked_at = time.monotonic()
+            if self.leases.get(user_address) is not lease:
+                # Returned (expired) while the call was in flight
+                self.leases.setdefault(user_address, Lease()).remaining += lease.remaining
+                lease.remaining = 0
+
+    def outstanding(self, user_address: str) -> int:
+        """Credits of this user currently held by this process."""
+        lease = self.leases.get(user_address.lower())
+        return lease.remaining if lease else 0
+
+    async def _give_back(self, user_address: str, lease: Lease):
+        remaining, lease.remaining = lease.remaining, 0
+        if remaining and not await add_credits(user_address, remaining):
+            # Keep them so the next sweep (or shutdown) tries again
+            self.leases.setdefault(user_address, Lease()).remaining += remaining
+
+    async def return_idle(self) -> int:
+        """Give back leases unused for CREDIT_LEASE_IDLE_SECONDS. Returns how many users."""
+        cutoff = time.monotonic() - config.CREDIT_LEASE_IDLE_SECONDS
+        idle = [
+            (user_address, lease) for user_address, lease in self.leases.items()
+            if lease.last_used < cutoff and not lease.lock.locked()
+        ]
+        for user_address, lease in idle:
+            del self.leases[user_address]
+        for user_address, lease in idle:
+            await self._give_back(user_address, lease)
+        return len(idle)
+
+    async def close(self):
+        """Give every lease back (called from main.lifespan on shutdown)."""
+        for task in list(self._refills):
+            await asyncio.gather(task, return_exceptions=True)
+        leases, self.leases = self.leases, {}
+        await asyncio.gather(*(self._give_back(user_address, lease) for user_address, lease in leases.items()))
+        if self.leases:
+            logger.error(f"Could not return leased credits for {len(self.leases)} users")
+
+    def stats(self) -> Dict:
+        return {
+            "users": len(self.leases),
+            "outstanding_credits": sum(lease.remaining for lease in self.leases.values()),
+            "charges": self.charges,
+            "lease_calls": self.lease_calls,
+        }
+
+
+credit_leaser = CreditLeaser()
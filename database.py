@@ -1,4 +1,6 @@
 import os
+import json
+import base64
 import logging
 from datetime import datetime, timezone
 from supabase import create_client, Client
@@ -28,7 +30,8 @@ supabase: Client = create_client(url, key)
 # -------------------------------------------------------------------
 # Scraper State
 # -------------------------------------------------------------------
-def get_scraper_state(key_name: str):
+def get_scraper_state(key_name: str, raise_errors: bool = False):
+    """Value of a state key, None if it is not set. Errors also answer None unless `raise_errors`."""
     try:
         response = supabase.table("scraper_state").select("value").eq("key", key_name).execute()
         if response.data and len(response.data) > 0:
@@ -36,6 +39,8 @@ def get_scraper_state(key_name: str):
         return None
     except Exception as e:
         logger.error(f"Error getting state for {key_name}: {e}")
+        if raise_errors:
+            raise
         return None
 
 def set_scraper_state(key_name: str, value: str):
@@ -60,14 +65,156 @@ def save_insight(insight_data: dict):
     try:
         supabase.table("insights").upsert(insight_data).execute()
         logger.info(f"Saved insight: {insight_data.get('id')}")
+        return True
     except Exception as e:
         logger.error(f"Error saving insight {insight_data.get('id')}: {e}")
+        return False
+
+def save_insights(insights: list):
+    """
+    Insert a page of insights in bulk: one existence check and one multi-row upsert.
+    Returns the rows that were actually new, or None if the write failed.
+    """
+    if not insights:
+        return []
+    
+    # One statement can't touch the same row twice, so collapse repeated ids
+    unique = {}
+    for insight in insights:
+        unique.setdefault(insight["id"], insight)
+    
+    try:
+        response = supabase.table("insights").select("id").in_("id", list(unique)).execute()
+        existing = {row["id"] for row in response.data or []}
+        new_rows = [row for insight_id, row in unique.items() if insight_id not in existing]
+        
+        if new_rows:
+            # ignore_duplicates covers rows inserted concurrently since the check
+            supabase.table("insights").upsert(
+                new_rows,
+                on_conflict="id",
+                ignore_duplicates=True
+            ).execute()
+            logger.info(f"Saved {len(new_rows)} insights ({len(insights) - len(new_rows)} skipped)")
+        return new_rows
+    except Exception as e:
+        logger.error(f"Error saving {len(unique)} insights: {e}")
+        return None
+
+# Columns a /news client may ask for; id and timestamp always come back (keyset)
+INSIGHT_FIELDS = ("id", "token_id", "timestamp", "title", "content", "source_count", "sources", "created_at")
+
+def encode_news_cursor(row: dict) -> str:
+    """Opaque keyset cursor pointing just past a row."""
+    raw = json.dumps([row["timestamp"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_news_cursor(cursor: str):
+    """(timestamp, id) from a cursor. Raises ValueError if it is malformed."""
+    try:
+        timestamp, insight_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(timestamp), str(insight_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _quote_filter_value(value: str) -> str:
+    return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def get_news(limit: int = 20, token_id: str = None, cursor: str = None, fields: list = None, offset: int = 0):
+    """
+    Latest insights, newest first, ordered by (timestamp, id).
+    With a cursor, pages by keyset (cost independent of depth); otherwise by offset.
+    Rows without a timestamp are left out: they have no place in the order and
+    would end a page with an unusable cursor.
+    Returns (rows, next_cursor). Raises on query errors so the API can answer 500.
+    """
+    # Explicit columns: "*" would also ship the search_vector column
+    columns = ",".join(INSIGHT_FIELDS)
+    if fields:
+        columns = ",".join(dict.fromkeys(["id", "timestamp", *fields]))
+    
+    query = supabase.table("insights").select(columns).not_.is_("timestamp", "null")
+    if token_id:
+        query = query.eq("token_id", token_id)
+    
+    if cursor:
+        timestamp, insight_id = decode_news_cursor(cursor)
+        query = query.or_(
+            f"timestamp.lt.{timestamp},"
+            f"and(timestamp.eq.{timestamp},id.lt.{_quote_filter_value(insight_id)})"
+        )
+    
+    query = query.order("timestamp", desc=True).order("id", desc=True)
+    if cursor or not offset:
+        query = query.limit(limit)
+    else:
+        query = query.range(offset, offset + limit - 1)
+    
+    rows = query.execute().data or []
+    next_cursor = encode_news_cursor(rows[-1]) if rows and len(rows) == limit else None
+    return rows, next_cursor
+
+def get_latest_news_per_token(token_ids: list, per_token: int = 5, fields: list = None):
+    """
+    Latest `per_token` insights for each token in one round trip
+    (latest_insights_per_token SQL function). Returns {token_id: rows}, newest
+    first; tokens without insights map to []. Raises on query errors.
+    """
+    columns = list(dict.fromkeys(["id", "timestamp", *fields])) if fields else None
+    response = supabase.rpc("latest_insights_per_token", {
+        "p_token_ids": list(token_ids),
+        "p_per_token": per_token,
+    }).execute()
+    grouped = {token_id: [] for token_id in token_ids}
+    for row in response.data or []:
+        grouped.setdefault(row["token_id"], []).append(row)
+    for token_id, rows in grouped.items():
+        rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+        if columns:
+            grouped[token_id] = [{column: row.get(column) for column in columns} for row in rows]
+    return grouped
+
+def get_token_daily_stats(token_id: str, since_day: str):
+    """Daily insight aggregates for a token from `since_day` (ISO date) on, newest day first. Raises on errors."""
+    query = supabase.table("token_daily_stats").select("day,insight_count,source_count,newest_insight_timestamp")
+    query = query.eq("token_id", token_id).gte("day", since_day).order("day", desc=True)
+    return query.execute().data or []
+
+def get_insights_created_after(created_at: str = None, insight_id: str = None, limit: int = 1000):
+    """
+    Insights in insert order (created_at, id), starting just past the given row.
+    Used to replicate the table into the local read store. Raises on query errors.
+    """
+    query = supabase.table("insights").select(",".join(INSIGHT_FIELDS))
+    if created_at:
+        created_at = _quote_filter_value(created_at)
+        query = query.or_(
+            f"created_at.gt.{created_at},"
+            f"and(created_at.eq.{created_at},id.gt.{_quote_filter_value(insight_id or '')})"
+        )
+    return query.order("created_at").order("id").limit(limit).execute().data or []
+
+def search_insights(q: str, token_id: str = None, since: int = None, until: int = None, limit: int = 20, offset: int = 0):
+    """
+    Full-text search over insight titles and content (search_insights SQL function,
+    GIN-indexed). Best matches first; `since`/`until` bound the insight timestamp.
+    Raises on query errors so the API can answer 500.
+    """
+    response = supabase.rpc("search_insights", {
+        "q": q,
+        "p_token_id": token_id,
+        "p_since": since,
+        "p_until": until,
+        "p_limit": limit,
+        "p_offset": offset,
+    }).execute()
+    return response.data or []
 
 # -------------------------------------------------------------------
 # Tokens
 # -------------------------------------------------------------------
-def get_all_tokens(enabled_only: bool = True):
-    """Get all tokens from the registry."""
+def get_all_tokens(enabled_only: bool = True, raise_errors: bool = False):
+    """Get all tokens from the registry. Errors answer [] unless `raise_errors`."""
     try:
         query = supabase.table("tokens").select("*")
         if enabled_only:
@@ -76,25 +223,15 @@ def get_all_tokens(enabled_only: bool = True):
         return response.data or []
     except Exception as e:
         logger.error(f"Error fetching tokens: {e}")
+        if raise_errors:
+            raise
         return []
 
 def get_user_usage_stats(user_address: str):
-    """Get usage statistics for the user."""
+    """Usage totals, last 24h / 30d and per-endpoint and per-key breakdowns (usage_summary SQL function, reads the rollups)."""
     try:
-        # Total requests
-        total = supabase.table("usage_logs").select("id", count="exact").eq("user_address", user_address.lower()).execute()
-        
-        # Requests in last 24h
-        one_day_ago = datetime.now(timezone.utc).timestamp() - 86400
-        # Supabase API might strictly need ISO string for gt filter on timestamp, but let's try. 
-        # Actually easier to just get recent logs or rely on client side aggregation if volume is low, 
-        # but for scalability we should use count queries.
-        # For MVP, let's just return total count.
-        
-        return {
-            "total_requests": total.count,
-            "plan": "Free" # TODO: Fetch from credits table
-        }
+        response = supabase.rpc("usage_summary", {"p_user_address": user_address}).execute()
+        return response.data
     except Exception as e:
         logger.error(f"Error getting usage stats: {e}")
         return {"total_requests": 0, "plan": "Unknown"}
@@ -126,12 +263,14 @@ def get_tokens_due_for_scrape():
         logger.error(f"Error getting due tokens: {e}")
         return []
 
-def update_token_last_scraped(token_id: str):
-    """Update the last_scraped timestamp for a token."""
+def update_token_last_scraped(token_id: str, last_insight_timestamp: int = None, last_insight_cursor: str = None):
+    """Update the last_scraped timestamp for a token, and its high-water mark if given."""
     try:
-        supabase.table("tokens").update({
-            "last_scraped": datetime.now(timezone.utc).isoformat()
-        }).eq("id", token_id).execute()
+        data = {"last_scraped": datetime.now(timezone.utc).isoformat()}
+        if last_insight_timestamp is not None:
+            data["last_insight_timestamp"] = last_insight_timestamp
+            data["last_insight_cursor"] = last_insight_cursor
+        supabase.table("tokens").update(data).eq("id", token_id).execute()
     except Exception as e:
         logger.error(f"Error updating last_scraped for {token_id}: {e}")
 
@@ -235,17 +374,16 @@ def revoke_api_key(key_id: str, user_address: str):
         return False
 
 def validate_api_key(key_hash: str):
-    """Check if key exists and is active."""
-    try:
-        response = supabase.table("api_keys").select("id, user_address, is_active").eq("key_hash", key_hash).execute()
-        if response.data:
-            key_data = response.data[0]
-            if key_data["is_active"]:
-                return key_data
-        return None
-    except Exception as e:
-        logger.error(f"Error validating key: {e}")
-        return None
+    """
+    Check if key exists and is active. Returns its row or None.
+    Raises on query errors, so callers can tell "invalid" from "unknown" (and not cache the latter).
+    """
+    response = supabase.table("api_keys").select("id, user_address, is_active").eq("key_hash", key_hash).execute()
+    if response.data:
+        key_data = response.data[0]
+        if key_data["is_active"]:
+            return key_data
+    return None
 
 # -------------------------------------------------------------------
 # Credits & Usage
@@ -259,40 +397,51 @@ def get_user_credits(user_address: str):
         return 0
 
 def deduct_credit(user_address: str, amount: int = 1):
-    """Deduct credits transactionally (simulated pending RPC)."""
-    # Note: Supabase-py doesn't support easy decrement without RPC function.
-    # For now, we fetch, substract, and update (optimistic concurrency).
+    """Deduct credits if the balance covers them, atomically (deduct_credits SQL function)."""
     try:
-        current = get_user_credits(user_address)
-        if current < amount:
-            return False
-        
-        supabase.table("credits").update({"balance": current - amount}).eq("user_address", user_address.lower()).execute()
-        return True
+        response = supabase.rpc("deduct_credits", {"p_user_address": user_address, "p_amount": amount}).execute()
+        return response.data is not None
     except Exception as e:
         logger.error(f"Error deducting credit for {user_address}: {e}")
         return False
 
-def log_api_usage(api_key_id: str, user_address: str, endpoint: str, status_code: int):
+def lease_credits(user_address: str, amount: int):
+    """
+    Take up to `amount` credits out of the balance for local spending. Returns how
+    many (0: the balance is empty). Raises on errors, which must not read as empty.
+    """
+    response = supabase.rpc("lease_credits", {"p_user_address": user_address, "p_amount": amount}).execute()
+    return response.data or 0
+
+def log_api_usage_batch(rows: list):
+    """
+    Insert usage_logs rows with one multi-row insert. Raises on errors, so the
+    caller can tell rejected rows (postgrest APIError with a SQLSTATE `code`)
+    from an unreachable database.
+    """
+    supabase.table("usage_logs").insert(rows).execute()
+
+def prune_usage_logs(keep_days: int, keep_hourly_days: int, batch: int):
+    """Delete up to `batch` raw usage logs past retention (and old hourly rollups). Returns how many (0 on errors)."""
     try:
-        supabase.table("usage_logs").insert({
-            "api_key_id": api_key_id,
-            "user_address": user_address,
-            "endpoint": endpoint,
-            "status_code": status_code
+        response = supabase.rpc("prune_usage_logs", {
+            "p_keep_days": keep_days,
+            "p_keep_hourly_days": keep_hourly_days,
+            "p_batch": batch,
         }).execute()
+        return response.data or 0
     except Exception as e:
-        logger.error(f"Error logging usage: {e}")
+        logger.error(f"Error pruning usage logs: {e}")
+        return 0
 
 # -------------------------------------------------------------------
 # Payments
 # -------------------------------------------------------------------
 def add_credits(user_address: str, amount: int):
-    """Add credits to a user."""
+    """Add credits to a user, atomically (add_credits SQL function)."""
     try:
-        current = get_user_credits(user_address)
-        supabase.table("credits").update({"balance": current + amount}).eq("user_address", user_address.lower()).execute()
-        return True
+        response = supabase.rpc("add_credits", {"p_user_address": user_address, "p_amount": amount}).execute()
+        return response.data is not None
     except Exception as e:
         logger.error(f"Error adding credits for {user_address}: {e}")
         return False
@@ -360,21 +509,19 @@ def verify_payment_transaction(tx_hash: str, user_address: str):
         if credits_to_add <= 0:
              return {"success": False, "message": "Amount too small"}
 
-        # 5. Record Payment
-        payment_data = {
-            "tx_hash": tx_hash,
-            "user_address": user_address.lower(),
-            "amount_usdc": amount_usdc,
-            "credits_added": credits_to_add,
-            "status": "confirmed",
-            "chain_id": 8453
-        }
-        supabase.table("payments").insert(payment_data).execute()
-        
-        # 6. Add Credits
-        add_credits(user_address, credits_to_add)
+        # 5. Record Payment and Add Credits (one transaction; a concurrent submit of the same tx loses)
+        response = supabase.rpc("record_payment_and_credit", {
+            "p_tx_hash": tx_hash,
+            "p_user_address": user_address,
+            "p_amount_usdc": amount_usdc,
+            "p_credits": credits_to_add,
+            "p_chain_id": 8453
+        }).execute()
+        if response.data is None:
+            logger.warning("Transaction already processed")
+            return {"success": False, "message": "Transaction already processed"}
         
-        return {"success": True, "credits_added": credits_to_add, "new_balance": get_user_credits(user_address)}
+        return {"success": True, "credits_added": credits_to_add, "new_balance": response.data}
 
     except Exception as e:
         logger.error(f"Payment verification error: {e}")
@@ -0,0 +1,105 @@
+"""
+Browserless HTTP session for CoinGecko fetches.
+
+Playwright only sets the session up (cookies, Cloudflare clearance, user agent);
+timeline and insight requests then go through a pooled keep-alive httpx client
+instead of page.evaluate("fetch(...)").
+"""
+import logging
+from typing import Dict, Optional
+
+# httpx is optional - without it the scraper stays on in-page fetches
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# HTTP/2 needs the h2 extra
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+import config
+
+logger = logging.getLogger(__name__)
+
+CHALLENGE_MARKERS = ("Just a moment...", "cf-chl", "challenge-platform", "cf_chl_opt")
+
+
+class ChallengeError(Exception):
+    """Upstream answered with a block page or a Cloudflare challenge."""
+
+
+def is_available() -> bool:
+    return httpx is not None
+
+
+class HttpSession:
+    """Pooled HTTP client carrying a browser context's cookies and user agent."""
+
+    def __init__(self, user_agent: str, cookies: list, referer: str, proxy: Optional[str] = None):
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            proxy=proxy,
+            headers={
+                "User-Agent": user_agent,
+                "Accept-Language": "en-US,en;q=0.9",
+                "Referer": referer,
+            },
+            timeout=config.HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=60),
+        )
+        self._set_cookies(cookies)
+
+    def _set_cookies(self, cookies: list):
+        for cookie in cookies:
+            self.client.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+            )
+
+    @classmethod
+    async def from_page(cls, page, proxy: Optional[str] = None) -> "HttpSession":
+        """Capture the session an already-navigated page has established."""
+        user_agent = await page.evaluate("navigator.userAgent")
+        cookies = await page.context.cookies(page.url)
+        return cls(user_agent, cookies, referer=page.url, proxy=proxy)
+
+    async def refresh(self, page):
+        """Take over the cookies a newly navigated page holds, keeping the open connections."""
+        self._set_cookies(await page.context.cookies(page.url))
+        self.client.headers["Referer"] = page.url
+
+    async def fetch(self, url: str, as_json: bool = False) -> Dict:
+        """
+        GET a URL. Returns the same {success, status, data} shape as the in-page
+        fetch; raises ChallengeError when the session is no longer trusted.
+        """
+        headers = {"Accept": "application/json"} if as_json else {"Accept": "text/html,*/*"}
+        try:
+            response = await self.client.get(url, headers=headers)
+        except httpx.HTTPError as e:
+            return {"success": False, "error": str(e)}
+
+        if response.status_code in (403, 503) or (
+            response.status_code != 200 and any(m in response.text for m in CHALLENGE_MARKERS)
+        ):
+            raise ChallengeError(f"HTTP {response.status_code} from {response.url.host}")
+        if response.status_code != 200:
+            return {"success": False, "status": response.status_code}
+
+        if as_json:
+            try:
+                return {"success": True, "data": response.json()}
+            except ValueError:
+                # A 200 challenge page instead of JSON
+                raise ChallengeError("Non-JSON response to JSON request")
+
+        if any(m in response.text for m in CHALLENGE_MARKERS):
+            raise ChallengeError("Challenge page served with HTTP 200")
+        return {"success": True, "data": response.text}
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,241 @@
+"""
+Embedded SQLite (WAL) replica of insights and tokens for the API read path.
+
+Supabase stays the system of record. The scraper's save path writes new rows
+here as it saves them, and a catch-up job replays everything inserted in
+Supabase since the last sync - in insert order (created_at, id), so insights
+backfilled with an older timeline timestamp are not missed. created_at is the
+inserting transaction's start time, so a row can commit after rows stamped
+later were already synced; each catch-up therefore re-reads the last
+LOCAL_STORE_SYNC_OVERLAP_SECONDS before its mark (the upsert makes that
+idempotent). Until the first catch-up has finished, reads keep going to
+Supabase.
+
+Enable with LOCAL_STORE_PATH. Calls run inline on the event loop (they take
+well under a millisecond) and share one connection behind a lock.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import config
+from async_database import get_all_tokens, get_insights_created_after, get_scraper_state
+from database import INSIGHT_FIELDS, decode_news_cursor, encode_news_cursor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS insights (
+    id TEXT PRIMARY KEY,
+    token_id TEXT,
+    timestamp INTEGER,
+    title TEXT,
+    content TEXT,
+    source_count INTEGER,
+    sources TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_insights_timestamp ON insights(timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_insights_token_timestamp ON insights(token_id, timestamp DESC, id DESC);
+
+CREATE TABLE IF NOT EXISTS tokens (
+    id TEXT PRIMARY KEY,
+    enabled INTEGER,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+UPSERT_INSIGHT = f"""
+INSERT INTO insights ({", ".join(INSIGHT_FIELDS)}) VALUES ({", ".join("?" * len(INSIGHT_FIELDS))})
+ON CONFLICT(id) DO UPDATE SET created_at = COALESCE(excluded.created_at, insights.created_at)
+"""
+
+
+class LocalStore:
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.ready = False
+        self.last_sync: Optional[float] = None
+        self.synced_rows = 0
+
+    def close(self):
+        self.db.close()
+
+    # ---------------------------------------------------------------
+    # Writes
+    # ---------------------------------------------------------------
+    def add_insights(self, rows: List[Dict]) -> int:
+        """Upsert rows by id. Returns how many were not in the store yet."""
+        ids = list({row["id"] for row in rows})
+        with self.lock, self.db:
+            known = sum(
+                self.db.execute(
+                    f"SELECT COUNT(*) FROM insights WHERE id IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchone()[0]
+                for chunk in (ids[i:i + 500] for i in range(0, len(ids), 500))
+            )
+            self.db.executemany(UPSERT_INSIGHT, [
+                tuple(json.dumps(row.get(f) or []) if f == "sources" else row.get(f) for f in INSIGHT_FIELDS)
+                for row in rows
+            ])
+        return len(ids) - known
+
+    def put_token(self, token: Dict):
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO tokens (id, enabled, data) VALUES (?, ?, ?)",
+                (token["id"], bool(token.get("enabled")), json.dumps(token, default=str)),
+            )
+
+    def replace_tokens(self, tokens: List[Dict]):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM tokens")
+            self.db.executemany(
+                "INSERT INTO tokens (id, enabled, data) VALUES (?, ?, ?)",
+                [(t["id"], bool(t.get("enabled")), json.dumps(t, default=str)) for t in tokens],
+            )
+
+    def set_state(self, *items: Tuple[str, Optional[str]]):
+        with self.lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", items)
+
+    # ---------------------------------------------------------------
+    # Reads
+    # ---------------------------------------------------------------
+    def get_state(self, key: str) -> Optional[str]:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def get_news(self, limit: int = 20, token_id: str = None, cursor: str = None, fields: list = None, offset: int = 0):
+        """Same contract as database.get_news: (rows, next_cursor), ValueError on a bad cursor."""
+        columns = list(INSIGHT_FIELDS)
+        if fields:
+            columns = list(dict.fromkeys(["id", "timestamp", *(f for f in fields if f in INSIGHT_FIELDS)]))
+
+        where, params = ["timestamp IS NOT NULL"], []
+        if token_id:
+            where.append("token_id = ?")
+            params.append(token_id)
+        if cursor:
+            timestamp, insight_id = decode_news_cursor(cursor)
+            where.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params += [timestamp, timestamp, insight_id]
+
+        sql = f"SELECT {', '.join(columns)} FROM insights"
+        sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        params += [limit, 0 if cursor else offset]
+
+        with self.lock:
+            rows = [dict(row) for row in self.db.execute(sql, params)]
+        for row in rows:
+            if "sources" in row:
+                row["sources"] = json.loads(row["sources"] or "[]")
+        next_cursor = encode_news_cursor(rows[-1]) if rows and len(rows) == limit else None
+        return rows, next_cursor
+
+    def get_news_batch(self, token_ids: List[str], per_token: int = 5, fields: list = None) -> Dict[str, List[Dict]]:
+        """Same contract as database.get_latest_news_per_token (one index walk per token)."""
+        return {
+            token_id: self.get_news(limit=per_token, token_id=token_id, fields=fields)[0]
+            for token_id in token_ids
+        }
+
+    def get_tokens(self, enabled_only: bool = True) -> List[Dict]:
+        sql = "SELECT data FROM tokens" + (" WHERE enabled" if enabled_only else "")
+        with self.lock:
+            rows = self.db.execute(sql).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> Dict:
+        with self.lock:
+            insights = self.db.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+            tokens = self.db.execute("SELECT COUNT(*) FROM tokens").fetchone()[0]
+        return {
+            "path": self.path,
+            "ready": self.ready,
+            "insights": insights,
+            "tokens": tokens,
+            "synced_rows": self.synced_rows,
+            "last_sync_seconds_ago": round(time.time() - self.last_sync) if self.last_sync else None,
+        }
+
+    # ---------------------------------------------------------------
+    # Catch-up from Supabase
+    # ---------------------------------------------------------------
+    def _sync_position(self) -> Tuple[Optional[str], Optional[str]]:
+        return self.get_state("sync_created_at"), self.get_state("sync_id")
+
+    @staticmethod
+    def _is_past(row: Dict, mark: Tuple[Optional[str], Optional[str]]) -> bool:
+        """True if the row sorts after the (created_at, id) sync mark."""
+        if mark[0] is None:
+            return True
+        return (datetime.fromisoformat(row["created_at"]), row["id"]) > (datetime.fromisoformat(mark[0]), mark[1])
+
+    async def catch_up(self) -> int:
+        """Copy insights inserted in Supabase since the last sync. Returns how many were new here."""
+        mark = self._sync_position()
+        created_at, insight_id = mark
+        if created_at:
+            overlap = timedelta(seconds=config.LOCAL_STORE_SYNC_OVERLAP_SECONDS)
+            created_at, insight_id = (datetime.fromisoformat(created_at) - overlap).isoformat(), ""
+        copied = 0
+        while True:
+            rows = await get_insights_created_after(created_at, insight_id, limit=config.LOCAL_STORE_SYNC_BATCH)
+            if not rows:
+                break
+            copied += self.add_insights(rows)
+            created_at, insight_id = rows[-1]["created_at"], rows[-1]["id"]
+            if self._is_past(rows[-1], mark):
+                mark = (created_at, insight_id)
+                self.set_state(("sync_created_at", created_at), ("sync_id", insight_id))
+            if len(rows) < config.LOCAL_STORE_SYNC_BATCH:
+                break
+        return copied
+
+    async def sync_tokens(self):
+        # Raises on errors, keeping the last good copy
+        tokens = await get_all_tokens(enabled_only=False, raise_errors=True)
+        self.replace_tokens(tokens)
+
+    async def sync(self):
+        """Catch up insights, the token registry and scraper state; marks the store ready."""
+        copied = await self.catch_up()
+        await self.sync_tokens()
+        self.set_state(("last_run", await get_scraper_state("last_run")))
+        self.synced_rows += copied
+        self.last_sync = time.time()
+        if not self.ready:
+            logger.info(f"Local store ready: {self.stats()['insights']} insights at {self.path}")
+        self.ready = True
+        return copied
+
+
+_local_store: Optional[LocalStore] = None
+
+
+def get_local_store() -> Optional[LocalStore]:
+    """Shared store instance, or None when LOCAL_STORE_PATH is empty."""
+    global _local_store
+    if _local_store is None and config.LOCAL_STORE_PATH:
+        _local_store = LocalStore(config.LOCAL_STORE_PATH)
+    return _local_store
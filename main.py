@@ -1,20 +1,57 @@
 import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException
+from datetime import datetime, timedelta, timezone
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from scraper import ScraperOrchestrator
-from database import (
-    supabase,
+import config
+from broadcaster import CLOSED, StreamFull, news_broadcaster
+from cache import (
+    MISSING,
+    api_key_cache,
+    content_etag,
+    etag_matches,
+    forget_api_key,
+    invalid_api_key_cache,
+    news_cache,
+    news_etag,
+    payload_etag,
+    TOKENS_KEY,
+    invalidate_tokens,
+    tokens_cache,
+)
+from credit_lease import credit_leaser
+from local_store import get_local_store
+from page_cache import get_page_cache
+from usage_log import UsageLogMiddleware, usage_logger
+from serialization import FastJSONResponse, dumps, join_object, raw_json
+from scraper import browser_pool
+from token_scheduler import TokenScheduler
+from rate_governor import governor_stats
+from database import INSIGHT_FIELDS, encode_news_cursor
+from async_database import (
+    get_news as get_news_page,
+    get_latest_news_per_token,
+    get_token_daily_stats,
+    search_insights,
     get_all_tokens,
+    get_scraper_state,
     add_token,
     delete_token,
     toggle_token,
 )
+import async_database
 import logging
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,35 +59,99 @@ logger = logging.getLogger(__name__)
 # Scheduler setup
 scheduler = AsyncIOScheduler()
 
+# Dispatches each token when its own scrape_interval expires
+token_scheduler = TokenScheduler()
+
+# Optional SQLite replica for the read endpoints (None unless LOCAL_STORE_PATH is set)
+local_store = get_local_store()
+
+
+def local_reads():
+    """The local store once it has caught up with Supabase, else None."""
+    return local_store if local_store and local_store.ready else None
+
+
+async def refresh_tokens_job():
+    """Pick up registry changes made outside this API (e.g. in the SQL editor)."""
+    try:
+        await token_scheduler.refresh()
+        if local_store:
+            await local_store.sync_tokens()
+    except Exception as e:
+        logger.error(f"Token refresh failed: {e}")
+    finally:
+        invalidate_tokens()
+
+
+async def page_cache_evict_job():
+    """Enforce PAGE_CACHE_MAX_MB / PAGE_CACHE_MAX_AGE_DAYS (the scheduler's workers never run a batch end)."""
+    try:
+        await asyncio.to_thread(get_page_cache().evict)
+    except Exception as e:
+        logger.error(f"Page cache eviction failed: {e}")
+
 
-async def run_scraper_job():
-    """Run the orchestrated multi-token scraper."""
-    logger.info("Running scheduled scraper job...")
-    orchestrator = ScraperOrchestrator()
+async def sync_local_store_job():
+    """Copy rows written to Supabase since the last sync (e.g. by another replica)."""
     try:
-        await orchestrator.run_all_due_tokens()
+        copied = await local_store.sync()
+        if copied:
+            logger.info(f"Local store caught up {copied} insights")
     except Exception as e:
-        logger.error(f"Scraper job failed: {e}")
+        logger.error(f"Local store sync failed: {e}")
+
+
+async def start_token_scheduler():
+    try:
+        await token_scheduler.start()
+    except Exception as e:
+        logger.error(f"Token scheduler failed to start, serving without scraping: {e}")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up...")
-    scheduler.add_job(run_scraper_job, 'interval', hours=1, id='scraper_job')
+    scheduler.add_job(refresh_tokens_job, 'interval', minutes=config.TOKEN_REFRESH_MINUTES, id='token_refresh')
+    scheduler.add_job(credit_lease_job, 'interval', seconds=60, id='credit_lease_expiry')
+    scheduler.add_job(usage_prune_job, 'interval', hours=24, id='usage_prune')
+    scheduler.add_job(
+        api_key_epoch_job, 'interval', seconds=config.API_KEY_EPOCH_POLL_SECONDS,
+        id='api_key_epoch', next_run_time=datetime.now(timezone.utc)
+    )
+    if get_page_cache():
+        scheduler.add_job(page_cache_evict_job, 'interval', minutes=config.PAGE_CACHE_EVICT_MINUTES, id='page_cache_evict')
+    if local_store:
+        # First run right away; reads go to Supabase until it has finished
+        scheduler.add_job(
+            sync_local_store_job, 'interval', minutes=config.LOCAL_STORE_SYNC_MINUTES,
+            id='local_store_sync', next_run_time=datetime.now(timezone.utc)
+        )
     scheduler.start()
+    usage_logger.start()
     
-    # Run immediately on startup
-    asyncio.create_task(run_scraper_job())
+    # Tokens never scraped (or overdue) are dispatched immediately. Started in the
+    # background so the read API comes up even when Playwright can't.
+    scheduler_start = asyncio.create_task(start_token_scheduler())
     
     yield
     
     # Shutdown
     logger.info("Shutting down...")
     scheduler.shutdown()
+    news_broadcaster.close()
+    scheduler_start.cancel()
+    await asyncio.gather(scheduler_start, return_exceptions=True)
+    await token_scheduler.stop()
+    await browser_pool.stop()
+    await credit_leaser.close()
+    await usage_logger.stop()
+    async_database.shutdown()
+    if local_store:
+        local_store.close()
 
 
-app = FastAPI(lifespan=lifespan, title="On-Chain News Provider")
+app = FastAPI(lifespan=lifespan, title="On-Chain News Provider", default_response_class=FastJSONResponse)
 
 # CORS
 app.add_middleware(
@@ -59,8 +160,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Compression (brotli when brotli-asgi is installed, gzip otherwise); SSE must not be buffered
+if BrotliMiddleware:
+    app.add_middleware(
+        BrotliMiddleware,
+        minimum_size=config.COMPRESS_MIN_BYTES,
+        gzip_fallback=True,
+        excluded_handlers=[r"^/news/stream$"],
+    )
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=config.COMPRESS_MIN_BYTES)
+
+# Outermost, so the logged status and latency are what the client got
+app.add_middleware(UsageLogMiddleware)
+
+
+def not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Set ETag headers on the response; True if the client's copy is current."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return etag_matches(request.headers.get("if-none-match"), etag)
+
 
 # -------------------------------------------------------------------
 # Pydantic Models
@@ -77,6 +200,48 @@ class TokenUpdate(BaseModel):
     scrape_interval: Optional[int] = None
 
 
+class Source(BaseModel):
+    url: Optional[str] = None
+    title: Optional[str] = None
+
+
+class Insight(BaseModel):
+    # Optional throughout: `fields` may project any subset
+    id: str
+    token_id: Optional[str] = None
+    timestamp: Optional[int] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    source_count: Optional[int] = None
+    sources: Optional[List[Source]] = None
+    created_at: Optional[str] = None
+
+
+class SearchResult(Insight):
+    rank: Optional[float] = None
+
+
+class Token(BaseModel):
+    id: str
+    name: str
+    enabled: Optional[bool] = None
+    scrape_interval: Optional[int] = None
+    last_scraped: Optional[str] = None
+    last_insight_timestamp: Optional[int] = None
+    last_insight_cursor: Optional[str] = None
+    newest_insight_timestamp: Optional[int] = None
+    created_at: Optional[str] = None
+
+
+class ApiKey(BaseModel):
+    # Never includes key_hash
+    id: str
+    name: Optional[str] = None
+    is_active: Optional[bool] = None
+    created_at: Optional[str] = None
+    last_used_at: Optional[str] = None
+
+
 # -------------------------------------------------------------------
 # Root
 # -------------------------------------------------------------------
@@ -88,47 +253,229 @@ async def root():
 # -------------------------------------------------------------------
 # News Endpoints
 # -------------------------------------------------------------------
-@app.get("/news")
-async def get_news(limit: int = 20, offset: int = 0, token_id: Optional[str] = None):
-    """Get latest insights from Supabase. Optionally filter by token."""
+def news_page(key: tuple, rows: list, next_cursor: Optional[str]) -> tuple:
+    """Cache entry for a /news page: encoded body, next cursor and ETag."""
+    return dumps(rows), next_cursor, news_etag(key, rows)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[list]:
+    """Validate a comma-separated `fields` parameter against the insight columns."""
+    if not fields:
+        return None
+    field_list = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = set(field_list) - set(INSIGHT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return field_list
+
+
+@app.get("/news", response_model=List[Insight])
+async def get_news(
+    request: Request,
+    response: Response,
+    limit: int = 20,
+    offset: int = 0,
+    token_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+):
+    """
+    Get latest insights from Supabase. Optionally filter by token.
+    
+    Pass the X-Next-Cursor header of a page back as `cursor` for the next one
+    (keyset pagination; `offset` is kept for older clients). `fields` is a
+    comma-separated column list, e.g. `fields=title,token_id` to skip
+    content/sources. Send the page's ETag back in If-None-Match to get a 304
+    while it is unchanged.
+    """
+    if not 1 <= limit <= config.NEWS_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.NEWS_MAX_LIMIT}")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="offset must not be negative")
+    field_list = parse_fields(fields)
+    
+    # Insights only change when the scraper writes, which invalidates the cache,
+    # so a cached page's ETag answers If-None-Match without touching the database
+    cache_key = (token_id, limit, offset, cursor, tuple(field_list or ()))
+    cached = news_cache.get(cache_key)
+    if cached is MISSING:
+        store = local_reads()
+        try:
+            if store:
+                rows, next_cursor = store.get_news(limit=limit, token_id=token_id, cursor=cursor, fields=field_list, offset=offset)
+            else:
+                rows, next_cursor = await get_news_page(limit=limit, token_id=token_id, cursor=cursor, fields=field_list, offset=offset)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            logger.error(f"Error fetching news: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        cached = news_page(cache_key, rows, next_cursor)
+        news_cache.set(cache_key, cached)
+    
+    body, next_cursor, etag = cached
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers=response.headers)
+    return raw_json(body, headers=response.headers)
+
+
+@app.get("/news/batch", response_model=Dict[str, List[Insight]])
+async def get_news_batch(
+    request: Request,
+    response: Response,
+    token_ids: str,
+    per_token: int = 5,
+    fields: Optional[str] = None,
+):
+    """
+    Latest `per_token` insights for each of a comma-separated list of tokens,
+    as {token_id: [insights]}. One query for every token not already cached;
+    pages are shared with /news?token_id=...&limit=per_token.
+    """
+    ids = list(dict.fromkeys(t.strip() for t in token_ids.split(",") if t.strip()))
+    if not 1 <= len(ids) <= config.NEWS_BATCH_MAX_TOKENS:
+        raise HTTPException(status_code=400, detail=f"Pass between 1 and {config.NEWS_BATCH_MAX_TOKENS} token_ids")
+    if not 1 <= per_token <= config.NEWS_BATCH_MAX_PER_TOKEN:
+        raise HTTPException(status_code=400, detail=f"per_token must be between 1 and {config.NEWS_BATCH_MAX_PER_TOKEN}")
+    field_list = parse_fields(fields)
+    
+    # Same keys as the equivalent /news pages
+    keys = {token_id: (token_id, per_token, 0, None, tuple(field_list or ())) for token_id in ids}
+    pages = {token_id: news_cache.get(key) for token_id, key in keys.items()}
+    missing = [token_id for token_id, page in pages.items() if page is MISSING]
+    if missing:
+        store = local_reads()
+        try:
+            if store:
+                fetched = store.get_news_batch(missing, per_token=per_token, fields=field_list)
+            else:
+                fetched = await get_latest_news_per_token(missing, per_token=per_token, fields=field_list)
+        except Exception as e:
+            logger.error(f"Error fetching news batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        for token_id in missing:
+            rows = fetched.get(token_id, [])
+            next_cursor = encode_news_cursor(rows[-1]) if rows and len(rows) == per_token else None
+            pages[token_id] = news_page(keys[token_id], rows, next_cursor)
+            news_cache.set(keys[token_id], pages[token_id])
+    
+    if not_modified(request, response, payload_etag([pages[token_id][2] for token_id in ids])):
+        return Response(status_code=304, headers=response.headers)
+    return raw_json(join_object({token_id: pages[token_id][0] for token_id in ids}), headers=response.headers)
+
+
+@app.get("/news/search", response_model=List[SearchResult])
+async def search_news(
+    q: str,
+    token_id: Optional[str] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0,
+):
+    """
+    Full-text search over insight titles and content, best matches first.
+    
+    `q` accepts web-search syntax ("quoted phrases", -exclusions, OR).
+    `since`/`until` bound the insight timestamp; page with `offset`.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    if not 1 <= limit <= config.SEARCH_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {config.SEARCH_MAX_LIMIT}")
     try:
-        query = supabase.table("insights").select("*")
-        
-        if token_id:
-            query = query.eq("token_id", token_id)
-        
-        response = query.order("timestamp", desc=True).range(offset, offset + limit - 1).execute()
-        return response.data
+        return await search_insights(q, token_id=token_id, since=since, until=until, limit=limit, offset=max(0, offset))
     except Exception as e:
-        logger.error(f"Error fetching news: {e}")
+        logger.error(f"Error searching news: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/news/stream")
+async def stream_news(token_ids: Optional[str] = None):
+    """
+    Server-sent events: one `insight` event per insight as the scraper saves it.
+    
+    `token_ids` is an optional comma-separated filter. Clients that fall too
+    far behind are disconnected and should reconnect (and backfill via /news).
+    Every stream also ends after STREAM_MAX_SECONDS so none outlives a
+    deploy; EventSource reconnects on its own after the `retry:` delay.
+    """
+    filters = [t.strip() for t in token_ids.split(",") if t.strip()] if token_ids else None
+    try:
+        subscriber = news_broadcaster.subscribe(filters)
+    except StreamFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    
+    async def events():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + config.STREAM_MAX_SECONDS
+        try:
+            yield f"retry: {config.STREAM_RETRY_MS}\n: connected\n\n"
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return
+                try:
+                    frame = await asyncio.wait_for(
+                        subscriber.queue.get(), min(config.STREAM_HEARTBEAT_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    if loop.time() < deadline:
+                        yield ": keepalive\n\n"
+                    continue
+                if frame is CLOSED:
+                    if subscriber.dropped:
+                        yield "event: dropped\ndata: {}\n\n"
+                    return
+                yield frame
+        finally:
+            news_broadcaster.unsubscribe(subscriber)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # -------------------------------------------------------------------
 # Token Management Endpoints
 # -------------------------------------------------------------------
-@app.get("/tokens")
-async def list_tokens():
+@app.get("/tokens", response_model=List[Token])
+async def list_tokens(request: Request, response: Response):
     """List all tokens in the registry."""
-    try:
-        tokens = get_all_tokens(enabled_only=False)
-        return tokens
-    except Exception as e:
-        logger.error(f"Error listing tokens: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    # A cached body's ETag answers If-None-Match without reading the registry
+    cached = tokens_cache.get(TOKENS_KEY)
+    if cached is MISSING:
+        store = local_reads()
+        try:
+            tokens = store.get_tokens(enabled_only=False) if store else await get_all_tokens(enabled_only=False, raise_errors=True)
+        except Exception as e:
+            logger.error(f"Error listing tokens: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+        body = dumps(tokens)
+        cached = (body, content_etag(body))
+        tokens_cache.set(TOKENS_KEY, cached)
+    body, etag = cached
+    if not_modified(request, response, etag):
+        return Response(status_code=304, headers=response.headers)
+    return raw_json(body, headers=response.headers)
 
 
 @app.post("/tokens")
 async def create_token(token: TokenCreate):
     """Add a new token to the registry."""
     try:
-        success = add_token(
+        success = await add_token(
             token_id=token.id,
             name=token.name,
             enabled=token.enabled,
             scrape_interval=token.scrape_interval
         )
         if success:
+            await refresh_tokens_job()
             return {"status": "created", "token_id": token.id}
         else:
             raise HTTPException(status_code=500, detail="Failed to create token")
@@ -141,8 +488,9 @@ async def create_token(token: TokenCreate):
 async def remove_token(token_id: str):
     """Remove a token from the registry."""
     try:
-        success = delete_token(token_id)
+        success = await delete_token(token_id)
         if success:
+            await refresh_tokens_job()
             return {"status": "deleted", "token_id": token_id}
         else:
             raise HTTPException(status_code=500, detail="Failed to delete token")
@@ -155,8 +503,9 @@ async def remove_token(token_id: str):
 async def enable_token(token_id: str):
     """Enable a token."""
     try:
-        success = toggle_token(token_id, enabled=True)
+        success = await toggle_token(token_id, enabled=True)
         if success:
+            await refresh_tokens_job()
             return {"status": "enabled", "token_id": token_id}
         raise HTTPException(status_code=500, detail="Failed to enable token")
     except Exception as e:
@@ -167,14 +516,40 @@ async def enable_token(token_id: str):
 async def disable_token(token_id: str):
     """Disable a token."""
     try:
-        success = toggle_token(token_id, enabled=False)
+        success = await toggle_token(token_id, enabled=False)
         if success:
+            await refresh_tokens_job()
             return {"status": "disabled", "token_id": token_id}
         raise HTTPException(status_code=500, detail="Failed to disable token")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/tokens/{token_id}/stats")
+async def token_stats(token_id: str, days: int = 30):
+    """
+    Insights and cited sources per UTC day for the last `days` days, with
+    totals and the newest insight timestamp. Served from the daily rollup.
+    """
+    if not 1 <= days <= config.TOKEN_STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"days must be between 1 and {config.TOKEN_STATS_MAX_DAYS}")
+    since_day = (datetime.now(timezone.utc) - timedelta(days=days - 1)).date().isoformat()
+    try:
+        daily = await get_token_daily_stats(token_id, since_day)
+    except Exception as e:
+        logger.error(f"Error fetching stats for {token_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    return {
+        "token_id": token_id,
+        "days": days,
+        "insight_count": sum(row["insight_count"] for row in daily),
+        "source_count": sum(row["source_count"] for row in daily),
+        "newest_insight_timestamp": max((row["newest_insight_timestamp"] or 0 for row in daily), default=None) or None,
+        "daily": daily,
+    }
+
+
 # -------------------------------------------------------------------
 # Status Endpoint
 # -------------------------------------------------------------------
@@ -182,14 +557,27 @@ async def disable_token(token_id: str):
 async def get_status():
     """Get scraper status."""
     try:
-        last_run = supabase.table("scraper_state").select("value").eq("key", "last_run").execute()
-        token_count = len(get_all_tokens(enabled_only=True))
+        store = local_reads()
+        if store:
+            last_run, tokens = store.get_state("last_run"), store.get_tokens(enabled_only=True)
+        else:
+            last_run, tokens = await asyncio.gather(
+                get_scraper_state("last_run"),
+                get_all_tokens(enabled_only=True),
+            )
         
         return {
-            "scheduler_running": scheduler.running,
+            "scheduler_running": scheduler.running and token_scheduler.running,
             "jobs": [job.id for job in scheduler.get_jobs()],
-            "last_run": last_run.data[0]["value"] if last_run.data else "Never",
-            "enabled_tokens": token_count
+            "token_scheduler": token_scheduler.snapshot(),
+            "news_cache": news_cache.stats(),
+            "news_stream": news_broadcaster.stats(),
+            "local_store": local_store.stats() if local_store else None,
+            "credit_leases": credit_leaser.stats(),
+            "usage_log": usage_logger.stats(),
+            "last_run": last_run or "Never",
+            "enabled_tokens": len(tokens),
+            "rate_governors": governor_stats()
         }
     except Exception as e:
         return {"error": str(e)}
@@ -199,27 +587,29 @@ async def get_status():
 # Manual Trigger
 # -------------------------------------------------------------------
 @app.post("/scrape")
-async def trigger_scrape():
-    """Manually trigger a scrape run."""
-    asyncio.create_task(run_scraper_job())
-    return {"status": "Scrape job started"}
+async def trigger_scrape(token_id: Optional[str] = None):
+    """Make all tokens (or one) due now. Tokens already being scraped are not run twice."""
+    queued = token_scheduler.trigger([token_id] if token_id else None)
+    if not queued:
+        return {"status": "Nothing due (no matching tokens, or already being scraped)", "tokens_queued": 0}
+    return {"status": "Scrape job started", "tokens_queued": queued}
 
 
 import secrets
 import hashlib
-from fastapi import Request, Depends, Security
+from fastapi import Depends, Security
 from fastapi.security import APIKeyHeader
-from database import (
+from async_database import (
     upsert_user,
     get_user,
     create_api_key,
     get_user_api_keys,
     revoke_api_key,
     validate_api_key,
+    set_scraper_state,
     get_user_credits,
-    deduct_credit,
-    log_api_usage,
     get_user_usage_stats,
+    prune_usage_logs,
     verify_payment_transaction
 )
 
@@ -229,6 +619,58 @@ from database import (
 # Security & Auth Models
 # -------------------------------------------------------------------
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
+API_KEY_PREFIX = "sk_live_"
+
+# scraper_state key bumped on every revocation; replicas drop their key cache when it changes
+API_KEY_EPOCH_STATE = "api_key_epoch"
+api_key_epoch: Optional[str] = None
+api_key_epoch_read = False  # api_key_epoch holds a successful read (None: no revocation yet)
+
+
+async def credit_lease_job():
+    """Return credits leased for users who have stopped calling."""
+    try:
+        returned = await credit_leaser.return_idle()
+        if returned:
+            logger.info(f"Returned idle credit leases for {returned} users")
+    except Exception as e:
+        logger.error(f"Credit lease expiry failed: {e}")
+
+
+async def usage_prune_job():
+    """Delete raw usage logs past USAGE_LOG_RETENTION_DAYS, in short batches."""
+    if not config.USAGE_LOG_RETENTION_DAYS:
+        return
+    try:
+        pruned = 0
+        while True:
+            deleted = await prune_usage_logs(
+                config.USAGE_LOG_RETENTION_DAYS, config.USAGE_HOURLY_RETENTION_DAYS, config.USAGE_PRUNE_BATCH
+            )
+            pruned += deleted
+            if deleted < config.USAGE_PRUNE_BATCH:
+                break
+        if pruned:
+            logger.info(f"Pruned {pruned} usage log rows")
+    except Exception as e:
+        logger.error(f"Usage log pruning failed: {e}")
+
+
+async def api_key_epoch_job():
+    """Drop cached API keys once another replica has revoked one."""
+    global api_key_epoch, api_key_epoch_read
+    try:
+        epoch = await get_scraper_state(API_KEY_EPOCH_STATE, raise_errors=True)
+    except Exception:
+        return  # unknown; compare against the last good read next time
+    
+    if api_key_epoch_read and epoch != api_key_epoch:
+        api_key_cache.clear()
+        logger.info("API key revoked elsewhere; key cache cleared")
+    elif not api_key_epoch_read:
+        # Keys cached while the epoch couldn't be read may predate a revocation
+        api_key_cache.clear()
+    api_key_epoch, api_key_epoch_read = epoch, True
 
 class SIWELogin(BaseModel):
     address: str
@@ -250,7 +692,7 @@ async def login(data: SIWELogin):
     """
     # TODO: Add siwe library verification: Use siwe.SiweMessage(message).verify(signature)
     address = data.address.lower()
-    success = upsert_user(address)
+    success = await upsert_user(address)
     if not success:
         raise HTTPException(status_code=500, detail="Login failed")
     return {"status": "ok", "address": address}
@@ -258,7 +700,7 @@ async def login(data: SIWELogin):
 @app.get("/users/me")
 async def get_profile(address: str):
     """Get user profile (requires address param for now)."""
-    user = get_user(address)
+    user = await get_user(address)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
@@ -270,13 +712,14 @@ async def get_profile(address: str):
 async def generate_key(data: APIKeyCreate, user_address: str):
     """Generate a new API key for the user."""
     # Generate a secure random key
-    raw_key = f"sk_live_{secrets.token_urlsafe(32)}"
+    raw_key = f"{API_KEY_PREFIX}{secrets.token_urlsafe(32)}"
     # Hash it for storage
     key_hash = hashlib.sha256(raw_key.encode()).hexdigest()
     
-    result = create_api_key(user_address, key_hash, data.name)
+    result = await create_api_key(user_address, key_hash, data.name)
     if not result:
         raise HTTPException(status_code=500, detail="Failed to create key")
+    invalid_api_key_cache.delete(key_hash)
     
     # Return the raw key ONLY ONCE
     return {
@@ -286,15 +729,21 @@ async def generate_key(data: APIKeyCreate, user_address: str):
         "created_at": result["created_at"]
     }
 
-@app.get("/api-keys")
+@app.get("/api-keys", response_model=List[ApiKey])
 async def list_keys(user_address: str):
-    return get_user_api_keys(user_address)
+    return await get_user_api_keys(user_address)
 
 @app.delete("/api-keys/{key_id}")
 async def revoke_key(key_id: str, user_address: str):
-    success = revoke_api_key(key_id, user_address)
+    success = await revoke_api_key(key_id, user_address)
     if not success:
         raise HTTPException(status_code=404, detail="Key not found")
+    
+    # This replica stops accepting the key now; the others on their next epoch poll
+    global api_key_epoch
+    forget_api_key(key_id)
+    api_key_epoch = secrets.token_hex(8)
+    await set_scraper_state(API_KEY_EPOCH_STATE, api_key_epoch)
     return {"status": "revoked"}
 
 # -------------------------------------------------------------------
@@ -302,12 +751,13 @@ async def revoke_key(key_id: str, user_address: str):
 # -------------------------------------------------------------------
 @app.get("/billing/balance")
 async def get_balance(user_address: str):
-    credits = get_user_credits(user_address)
-    return {"credits": credits}
+    credits = await get_user_credits(user_address)
+    # Credits leased by this process are out of the stored balance but still the user's
+    return {"credits": credits + credit_leaser.outstanding(user_address)}
 
 @app.get("/billing/usage")
 async def get_usage(user_address: str):
-    stats = get_user_usage_stats(user_address)
+    stats = await get_user_usage_stats(user_address)
     return stats
 
 @app.post("/billing/verify")
@@ -318,7 +768,7 @@ async def verify_payment(payload: dict):
     if not tx_hash or not user_address:
         raise HTTPException(status_code=400, detail="Missing tx_hash or user_address")
         
-    result = verify_payment_transaction(tx_hash, user_address)
+    result = await verify_payment_transaction(tx_hash, user_address)
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
         
@@ -327,6 +777,31 @@ async def verify_payment(payload: dict):
 # -------------------------------------------------------------------
 # Middleware / Dependency for API Key Protection
 # -------------------------------------------------------------------
+async def authenticate(api_key: str) -> Optional[dict]:
+    """Key metadata for a raw API key, or None if it is unknown or revoked. Cached both ways."""
+    if not api_key.startswith(API_KEY_PREFIX):
+        return None
+    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    
+    key_data = api_key_cache.get(key_hash)
+    if key_data is not MISSING:
+        return key_data
+    if invalid_api_key_cache.get(key_hash) is not MISSING:
+        return None
+    
+    try:
+        key_data = await validate_api_key(key_hash)
+    except Exception as e:
+        logger.error(f"Error validating key: {e}")
+        raise HTTPException(status_code=503, detail="Key validation unavailable")
+    
+    if key_data:
+        api_key_cache.set(key_hash, key_data)
+    else:
+        invalid_api_key_cache.set(key_hash, None)
+    return key_data
+
+
 async def verify_api_key(request: Request, api_key: str = Security(API_KEY_HEADER)):
     """Dependency to validate API key and deduct credits."""
     # Skip for public/auth/management endpoints
@@ -342,17 +817,20 @@ async def verify_api_key(request: Request, api_key: str = Security(API_KEY_HEADE
         # Let's enforce for specific endpoints if needed.
         return None
 
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
-    key_data = validate_api_key(key_hash)
-    
+    key_data = await authenticate(api_key)
     if not key_data:
         raise HTTPException(status_code=401, detail="Invalid API Key")
     
-    # Deduct credit
-    user_address = key_data["user_address"]
-    allowed = deduct_credit(user_address, 1) # 1 credit per call
+    # UsageLogMiddleware logs the call with its final status once the response is sent
+    request.state.api_key = key_data
     
-    log_api_usage(key_data["id"], user_address, request.url.path, 200) # Log tentative success
+    # Deduct credit (from this process's lease; a DB call only when it runs dry)
+    user_address = key_data["user_address"]
+    try:
+        allowed = await credit_leaser.charge(user_address, 1) # 1 credit per call
+    except Exception as e:
+        logger.error(f"Error charging credits for {user_address}: {e}")
+        raise HTTPException(status_code=503, detail="Billing unavailable")
     
     if not allowed:
         raise HTTPException(status_code=402, detail="Insufficient credits")
@@ -363,4 +841,9 @@ async def verify_api_key(request: Request, api_key: str = Security(API_KEY_HEADE
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Without a grace timeout uvicorn waits for every open connection before the
+    # lifespan shutdown runs, so a connected stream would block it indefinitely
+    uvicorn.run(
+        "main:app", host="0.0.0.0", port=8000, reload=True,
+        timeout_graceful_shutdown=config.SHUTDOWN_GRACE_SECONDS,
+    )
@@ -0,0 +1,176 @@
+"""
+Content-addressed on-disk cache of fetched timeline JSON and insight HTML.
+
+Layout under PAGE_CACHE_DIR:
+    objects/ab/abcdef...gz        gzip-compressed page, named by its SHA-256
+    refs/<token_id>/<key>.json    (token_id, cursor) -> hash, fetch time,
+                                  timeline timestamp and last ingested hash
+
+A failure after a fetch (DB error, parser bug, crash mid-token) no longer
+means refetching through the rate-limited path, and pages whose content was
+already ingested are not parsed again.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_KEY = "__timeline__"
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """Compressed page store keyed by (token_id, cursor) with size/age eviction."""
+
+    def __init__(self, root: str, max_bytes: int, max_age: float):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.objects = self.root / "objects"
+        self.refs = self.root / "refs"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.refs.mkdir(parents=True, exist_ok=True)
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / f"{digest}.gz"
+
+    def _ref_path(self, token_id: str, cursor: str) -> Path:
+        key = hashlib.sha1(cursor.encode("utf-8")).hexdigest()[:20]
+        return self.refs / token_id / f"{key}.json"
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _read_ref(self, token_id: str, cursor: str) -> Optional[Dict]:
+        try:
+            return json.loads(self._ref_path(token_id, cursor).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def get(self, token_id: str, cursor: str, max_age: Optional[float] = None) -> Optional[str]:
+        """Cached content for (token_id, cursor), or None if missing/too old."""
+        ref = self._read_ref(token_id, cursor)
+        if not ref:
+            return None
+        if max_age is not None and time.time() - ref["fetched_at"] > max_age:
+            return None
+
+        path = self._object_path(ref["hash"])
+        try:
+            content = gzip.decompress(path.read_bytes()).decode("utf-8")
+            os.utime(path)  # recently used objects survive eviction longest
+            return content
+        except FileNotFoundError:
+            # Object was evicted
+            return None
+        except (OSError, EOFError) as e:
+            logger.warning(f"Page cache miss for {token_id} ...{cursor[-8:]}: {e}")
+            return None
+
+    def put(self, token_id: str, cursor: str, content: str, timestamp: Optional[int] = None) -> str:
+        """Store content and point (token_id, cursor) at it. Returns its hash."""
+        digest = content_hash(content)
+        path = self._object_path(digest)
+        if path.exists():
+            os.utime(path)
+        else:
+            self._write_atomic(path, gzip.compress(content.encode("utf-8"), compresslevel=6))
+
+        ref = self._read_ref(token_id, cursor) or {}
+        ref.update({"cursor": cursor, "hash": digest, "fetched_at": time.time(), "timestamp": timestamp})
+        self._write_atomic(self._ref_path(token_id, cursor), json.dumps(ref).encode("utf-8"))
+        return digest
+
+    def is_ingested(self, token_id: str, cursor: str, digest: str) -> bool:
+        """True if exactly this content was already parsed and saved."""
+        ref = self._read_ref(token_id, cursor)
+        return bool(ref) and ref.get("ingested_hash") == digest
+
+    def mark_ingested(self, token_id: str, cursor: str, digest: str):
+        ref = self._read_ref(token_id, cursor)
+        if not ref:
+            return
+        ref["ingested_hash"] = digest
+        self._write_atomic(self._ref_path(token_id, cursor), json.dumps(ref).encode("utf-8"))
+
+    def entries(self, token_id: str) -> Iterator[Tuple[str, Optional[int], str]]:
+        """(cursor, timestamp, html) for every cached insight page of a token, e.g. to re-parse."""
+        token_dir = self.refs / token_id
+        if not token_dir.is_dir():
+            return
+        for ref_path in token_dir.glob("*.json"):
+            try:
+                ref = json.loads(ref_path.read_text())
+            except (OSError, ValueError):
+                continue
+            if ref["cursor"] == TIMELINE_KEY:
+                continue
+            content = self.get(token_id, ref["cursor"])
+            if content is not None:
+                yield ref["cursor"], ref.get("timestamp"), content
+
+    def evict(self) -> int:
+        """Drop objects past max_age, then least recently used ones until under max_bytes."""
+        now = time.time()
+        objects = []
+        for path in self.objects.glob("*/*.gz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            objects.append((stat.st_mtime, stat.st_size, path))
+
+        objects.sort()
+        total = sum(size for _, size, _ in objects)
+        removed = 0
+        for mtime, size, path in objects:
+            if now - mtime <= self.max_age and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+                total -= size
+                removed += 1
+            except OSError:
+                pass
+
+        # Refs pointing at evicted objects are plain misses; prune the stale ones
+        for ref_path in self.refs.glob("*/*.json"):
+            try:
+                if now - ref_path.stat().st_mtime > self.max_age:
+                    ref_path.unlink()
+            except OSError:
+                pass
+
+        if removed:
+            logger.info(f"Page cache evicted {removed} objects ({total / 1e6:.1f} MB kept)")
+        return removed
+
+
+_page_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> Optional[PageCache]:
+    """Shared cache instance, or None when PAGE_CACHE_DIR is empty."""
+    global _page_cache
+    if _page_cache is None and config.PAGE_CACHE_DIR:
+        _page_cache = PageCache(
+            config.PAGE_CACHE_DIR,
+            max_bytes=config.PAGE_CACHE_MAX_MB * 1024 * 1024,
+            max_age=config.PAGE_CACHE_MAX_AGE_DAYS * 86400,
+        )
+    return _page_cache
@@ -0,0 +1,271 @@
+"""
+HTML parser backends for CoinGecko insight pages.
+
+Every backend yields identical insight dicts. lxml (XPath over a C-built tree)
+is the fast default; the BeautifulSoup backend is kept for comparison and as a
+fallback when lxml is not installed. See bench_parsers.py.
+"""
+import hashlib
+import logging
+from typing import Dict, List, Optional
+
+from bs4 import BeautifulSoup
+
+# lxml is optional - fall back to BeautifulSoup without it
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class InsightParser:
+    """
+    Turns an insight page into insight dicts for one token.
+
+    Backends only locate elements and read their text/attributes; the
+    extraction rules below are shared so the output cannot drift apart.
+    """
+    name = "base"
+
+    def entries(self, html: str) -> list:
+        raise NotImplementedError
+
+    def content(self, entry):
+        raise NotImplementedError
+
+    def title(self, content):
+        raise NotImplementedError
+
+    def body(self, content):
+        raise NotImplementedError
+
+    def source_count(self, content):
+        raise NotImplementedError
+
+    def links(self, entry) -> list:
+        """External-looking links anywhere in the entry."""
+        raise NotImplementedError
+
+    def source_links(self, entry) -> list:
+        """Links inside a source/citation section."""
+        raise NotImplementedError
+
+    def attr(self, el, name: str) -> str:
+        return el.get(name, "")
+
+    def text(self, el) -> str:
+        raise NotImplementedError
+
+    def parse(self, html: str, token_id: str, timestamp: int) -> List[Dict]:
+        if not html:
+            return []
+
+        results = []
+
+        for entry in self.entries(html):
+            try:
+                content = self.content(entry)
+                if content is None:
+                    continue
+
+                title_el = self.title(content)
+                body_el = self.body(content)
+                sources_el = self.source_count(content)
+
+                title = self.text(title_el).rstrip(":") if title_el is not None else ""
+                body = self.text(body_el) if body_el is not None else ""
+
+                data_url = self.attr(entry, "data-url")
+                insight_id = data_url.split("/")[-1] if data_url else None
+                if not insight_id:
+                    # Stable across runs so entries without a data-url still dedupe
+                    digest = hashlib.sha1(f"{title}\n{body}".encode()).hexdigest()[:12]
+                    insight_id = f"gen_{token_id}_{timestamp}_{digest}"
+
+                # Prefix with token_id to ensure uniqueness across tokens
+                full_id = f"{token_id}_{insight_id}"
+
+                # Extract source count
+                source_count = 0
+                if sources_el is not None:
+                    try:
+                        source_count = int(self.text(sources_el).split()[0])
+                    except:
+                        pass
+
+                # Extract source URLs - look for links in the entry
+                sources = []
+                seen_urls = set()
+
+                for link in self.links(entry):
+                    href = self.attr(link, "href")
+                    text = self.text(link)
+
+                    # Skip internal CoinGecko links
+                    if "coingecko.com" in href:
+                        continue
+
+                    # Skip empty links
+                    if not href or not text:
+                        continue
+
+                    sources.append({
+                        "url": href,
+                        "title": text[:200]  # Limit title length
+                    })
+                    seen_urls.add(href)
+
+                # Also check for source indicators/citations
+                for link in self.source_links(entry):
+                    href = self.attr(link, "href")
+                    if href and "coingecko.com" not in href and href not in seen_urls:
+                        sources.append({
+                            "url": href,
+                            "title": self.text(link)[:200]
+                        })
+                        seen_urls.add(href)
+
+                results.append({
+                    "id": full_id,
+                    "token_id": token_id,
+                    "timestamp": timestamp,
+                    "title": title,
+                    "content": body,
+                    "source_count": source_count,
+                    "sources": sources,  # Array of {url, title}
+                })
+            except Exception as e:
+                logger.warning(f"[{token_id}] Parse error ({self.name}): {e}")
+
+        return results
+
+
+class SoupInsightParser(InsightParser):
+    """Reference backend: BeautifulSoup with the stdlib html.parser."""
+    name = "bs4"
+
+    def entries(self, html: str) -> list:
+        return BeautifulSoup(html, "html.parser").select(".gecko-timeline-entry")
+
+    def content(self, entry):
+        return entry.select_one(".gecko-timeline-entry-content")
+
+    def title(self, content):
+        return content.select_one(".gecko-insight .tw-font-semibold")
+
+    def body(self, content):
+        return content.select_one(".gecko-insight .tw-font-normal")
+
+    def source_count(self, content):
+        return content.select_one(".tw-text-xs.tw-leading-4")
+
+    def links(self, entry) -> list:
+        return entry.select("a[href*='http']")
+
+    def source_links(self, entry) -> list:
+        return entry.select(".gecko-insight-sources a, .insight-source a, [class*='source'] a")
+
+    def text(self, el) -> str:
+        return el.get_text(strip=True)
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlInsightParser(InsightParser):
+    """Fast backend: lxml tree with precompiled XPath equivalents of the CSS selectors."""
+    name = "lxml"
+
+    # Strings inside these never count as text in BeautifulSoup's get_text()
+    _SKIP_TEXT = {"script", "style", "template", "rt", "rp"}
+
+    def __init__(self):
+        # Descendant selectors match ancestors outside the scoped element, as in CSS
+        self._entries = etree.XPath(f"//*[{_has_class('gecko-timeline-entry')}]")
+        self._content = etree.XPath(f"(.//*[{_has_class('gecko-timeline-entry-content')}])[1]")
+        self._title = etree.XPath(
+            f"(.//*[{_has_class('tw-font-semibold')}][ancestor::*[{_has_class('gecko-insight')}]])[1]"
+        )
+        self._body = etree.XPath(
+            f"(.//*[{_has_class('tw-font-normal')}][ancestor::*[{_has_class('gecko-insight')}]])[1]"
+        )
+        self._source_count = etree.XPath(
+            f"(.//*[{_has_class('tw-text-xs')} and {_has_class('tw-leading-4')}])[1]"
+        )
+        self._links = etree.XPath(".//a[contains(@href, 'http')]")
+        # [class*='source'] already covers .gecko-insight-sources and .insight-source
+        self._source_links = etree.XPath(".//a[ancestor::*[contains(@class, 'source')]]")
+
+    @staticmethod
+    def _first(matches: list):
+        return matches[0] if matches else None
+
+    def entries(self, html: str) -> list:
+        try:
+            root = lxml.html.fromstring(html)
+        except etree.ParserError:
+            return []
+        return self._entries(root)
+
+    def content(self, entry):
+        return self._first(self._content(entry))
+
+    def title(self, content):
+        return self._first(self._title(content))
+
+    def body(self, content):
+        return self._first(self._body(content))
+
+    def source_count(self, content):
+        return self._first(self._source_count(content))
+
+    def links(self, entry) -> list:
+        return self._links(entry)
+
+    def source_links(self, entry) -> list:
+        return self._source_links(entry)
+
+    def text(self, el) -> str:
+        parts = []
+        self._collect_text(el, parts)
+        return "".join(parts)
+
+    def _collect_text(self, el, parts: list):
+        """Stripped, non-empty text nodes in document order (BeautifulSoup semantics)."""
+        # Comments and processing instructions have a non-string tag
+        if isinstance(el.tag, str) and el.tag not in self._SKIP_TEXT:
+            if el.text:
+                text = el.text.strip()
+                if text:
+                    parts.append(text)
+            for child in el:
+                self._collect_text(child, parts)
+                if child.tail:
+                    tail = child.tail.strip()
+                    if tail:
+                        parts.append(tail)
+
+
+BACKENDS = {
+    SoupInsightParser.name: SoupInsightParser,
+    LxmlInsightParser.name: LxmlInsightParser,
+}
+
+_parsers: Dict[str, InsightParser] = {}
+
+
+def get_parser(name: Optional[str] = None) -> InsightParser:
+    """Shared parser instance for a backend (default: config.HTML_PARSER)."""
+    name = name or config.HTML_PARSER
+    if name == LxmlInsightParser.name and lxml is None:
+        logger.warning("lxml not installed, falling back to BeautifulSoup parser")
+        name = SoupInsightParser.name
+    if name not in _parsers:
+        _parsers[name] = BACKENDS[name]()
+    return _parsers[name]
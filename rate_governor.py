@@ -0,0 +1,102 @@
+"""
+Adaptive request pacing shared by every TokenScraper on the same egress lane.
+
+Additive-increase/multiplicative-decrease: each healthy response nudges the
+lane's request rate up, each 429 multiplies the spacing and pauses the whole
+lane with an exponential backoff (RATE_LIMIT_BACKOFF_INITIAL/MAX/MULTIPLIER).
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+def lane_label(proxy: Optional[str]) -> str:
+    """Printable lane name (proxy host:port without credentials)."""
+    if not proxy:
+        return "direct"
+    parts = urlsplit(proxy if "://" in proxy else f"http://{proxy}")
+    return f"{parts.hostname}:{parts.port}" if parts.port else str(parts.hostname)
+
+
+class RateGovernor:
+    """AIMD pacing and 429 backoff for one egress IP/proxy."""
+
+    def __init__(self, lane: str):
+        self.lane = lane
+        self.interval = config.REQUEST_INTERVAL_START  # seconds between requests
+        self.backoff = config.RATE_LIMIT_BACKOFF_INITIAL
+        self.next_slot = 0.0
+        self.blocked_until = 0.0
+        self.successes = 0
+        self.rate_limited = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        """Current target rate in requests per second."""
+        return 1.0 / self.interval
+
+    async def acquire(self):
+        """Wait for this lane's next request slot."""
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, self.blocked_until, now)
+            # Small jitter so lanes don't tick like a metronome
+            self.next_slot = slot + self.interval * random.uniform(0.85, 1.15)
+
+        while True:
+            delay = max(slot, self.blocked_until) - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def on_success(self):
+        """Additive increase: speed up a little after a healthy response."""
+        self.successes += 1
+        self.backoff = config.RATE_LIMIT_BACKOFF_INITIAL
+        rate = min(self.rate + config.RATE_GOVERNOR_INCREASE, 1.0 / config.REQUEST_INTERVAL_MIN)
+        self.interval = 1.0 / rate
+
+    def on_rate_limited(self):
+        """Multiplicative decrease: slow down and pause the lane after a 429."""
+        self.rate_limited += 1
+        self.interval = min(self.interval * config.RATE_LIMIT_BACKOFF_MULTIPLIER, config.REQUEST_INTERVAL_MAX)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + self.backoff)
+        logger.warning(
+            f"[lane {self.lane}] Rate limited. Pausing {self.backoff}s, "
+            f"then {self.interval:.1f}s between requests"
+        )
+        self.backoff = min(self.backoff * config.RATE_LIMIT_BACKOFF_MULTIPLIER, config.RATE_LIMIT_BACKOFF_MAX)
+
+    def snapshot(self) -> Dict:
+        return {
+            "lane": self.lane,
+            "requests_per_minute": round(self.rate * 60, 2),
+            "interval_seconds": round(self.interval, 2),
+            "paused_for_seconds": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+            "next_backoff_seconds": self.backoff,
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+        }
+
+
+_governors: Dict[str, RateGovernor] = {}
+
+
+def get_governor(proxy: Optional[str]) -> RateGovernor:
+    """The shared governor for a proxy lane (None = direct egress)."""
+    label = lane_label(proxy)
+    if label not in _governors:
+        _governors[label] = RateGovernor(label)
+    return _governors[label]
+
+
+def governor_stats() -> List[Dict]:
+    return [governor.snapshot() for governor in _governors.values()]
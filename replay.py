@@ -0,0 +1,299 @@
+"""
+Offline record/replay harness for the scraper.
+
+Serves recorded timeline JSON and insight HTML through fake Playwright
+pages/contexts, and swaps the scraper's database functions for an in-memory
+store that counts calls - so TokenScraper and ScraperOrchestrator can be
+exercised without CoinGecko, Chromium or Supabase.
+
+Recordings are either the bundled fixtures (fixtures/timelines/<token>.json
+plus fixtures/insights/<token>_<timestamp>.html) or a page cache directory
+captured by a live run with PAGE_CACHE_DIR set (see page_cache.py).
+"""
+import json
+import os
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# database.py insists on credentials at import; replay never talks to Supabase
+os.environ.setdefault("SUPABASE_URL", "http://replay.invalid")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "replay")
+
+import config
+import local_store
+import page_cache
+import rate_governor
+import scraper
+from page_cache import TIMELINE_KEY, PageCache
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures"
+
+
+class Recording:
+    """Recorded timeline JSON and insight HTML per token slug."""
+
+    def __init__(self):
+        self.timelines: Dict[str, List[Dict]] = {}
+        self.pages: Dict[str, Dict[str, str]] = {}  # token -> cursor -> html
+
+    @property
+    def tokens(self) -> List[str]:
+        return sorted(self.timelines)
+
+    @classmethod
+    def from_fixtures(cls, root: Path = FIXTURE_DIR) -> "Recording":
+        recording = cls()
+        for path in sorted((root / "timelines").glob("*.json")):
+            token_id = path.stem
+            timeline = json.loads(path.read_text())
+            recording.timelines[token_id] = timeline
+            pages = recording.pages.setdefault(token_id, {})
+            for item in timeline:
+                cursor = item.get("latest_insight_cursor")
+                html_path = root / "insights" / f"{token_id}_{item.get('timestamp')}.html"
+                if cursor and html_path.exists():
+                    pages[cursor] = html_path.read_text(encoding="utf-8")
+        return recording
+
+    @classmethod
+    def from_page_cache(cls, root: str) -> "Recording":
+        recording = cls()
+        cache = PageCache(root, max_bytes=0, max_age=float("inf"))
+        for token_dir in sorted(cache.refs.iterdir()):
+            token_id = token_dir.name
+            timeline = cache.get(token_id, TIMELINE_KEY)
+            if timeline is None:
+                continue
+            recording.timelines[token_id] = json.loads(timeline)
+            recording.pages[token_id] = {cursor: html for cursor, _, html in cache.entries(token_id)}
+        return recording
+
+
+class FakePage:
+    """Just enough of playwright's Page for TokenScraper's in-page fetch path."""
+
+    def __init__(self, context: "FakeContext"):
+        self.context = context
+        self.url = "about:blank"
+
+    async def add_init_script(self, script: str):
+        pass
+
+    async def goto(self, url: str, **kwargs):
+        self.url = url
+        self.context.server.counts["navigations"] += 1
+
+    async def evaluate(self, script: str, url: str):
+        return self.context.server.respond(url)
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    def __init__(self, server: "ReplayServer"):
+        self.server = server
+        self.browser = None
+
+    async def new_page(self) -> FakePage:
+        self.server.counts["pages_opened"] += 1
+        return FakePage(self)
+
+    async def cookies(self, urls=None) -> list:
+        return []
+
+    async def close(self):
+        pass
+
+
+class ReplayServer:
+    """Answers CoinGecko timeline/insight URLs from a Recording."""
+
+    def __init__(self, recording: Recording, aliases: Dict[str, str]):
+        self.recording = recording
+        self.aliases = aliases  # benchmark token id -> recorded token slug
+        self.counts = Counter()
+
+    def respond(self, url: str) -> Dict:
+        parts = urlsplit(url)
+        segments = parts.path.strip("/").split("/")
+        if segments[0] == "price_charts":
+            self.counts["timeline_fetches"] += 1
+            timeline = self.recording.timelines.get(self.aliases.get(segments[1], segments[1]))
+            if timeline is None:
+                return {"success": False, "status": 404}
+            return {"success": True, "data": json.loads(json.dumps(timeline))}
+
+        self.counts["insight_fetches"] += 1
+        token_id = segments[segments.index("coins") + 1]
+        cursor = parse_qs(parts.query).get("cursor", [""])[0]
+        html = self.recording.pages.get(self.aliases.get(token_id, token_id), {}).get(cursor)
+        if html is None:
+            return {"success": False, "status": 404}
+        return {"success": True, "data": html}
+
+
+class ReplayBrowserPool:
+    """BrowserPool stand-in handing out FakeContexts on round-robin proxy lanes."""
+
+    def __init__(self, server: ReplayServer):
+        self.server = server
+        self.proxy_index = 0
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def _get_next_proxy(self) -> Optional[str]:
+        return scraper.BrowserPool._get_next_proxy(self)
+
+    async def acquire_context(self, proxy: Optional[str] = None) -> FakeContext:
+        return FakeContext(self.server)
+
+    async def release_context(self, context, proxy: Optional[str] = None, healthy: bool = True):
+        pass
+
+
+class InMemoryDatabase:
+    """The async_database functions the scraper imports, backed by dicts, with call counters."""
+
+    def __init__(self, tokens: List[Dict]):
+        self.tokens = {token["id"]: token for token in tokens}
+        self.insights: Dict[str, Dict] = {}
+        self.state: Dict[str, str] = {}
+        self.calls = Counter()
+        self.round_trips = 0
+
+    async def save_insights(self, insights: list):
+        self.calls["save_insights"] += 1
+        if not insights:
+            return []
+        self.round_trips += 1  # existence check
+        unique = {}
+        for insight in insights:
+            unique.setdefault(insight["id"], insight)
+        new_rows = [row for insight_id, row in unique.items() if insight_id not in self.insights]
+        if new_rows:
+            self.round_trips += 1  # bulk upsert
+            for row in new_rows:
+                self.insights[row["id"]] = row
+        return new_rows
+
+    async def update_token_last_scraped(self, token_id: str, last_insight_timestamp: int = None, last_insight_cursor: str = None):
+        self.calls["update_token_last_scraped"] += 1
+        self.round_trips += 1
+        token = self.tokens[token_id]
+        token["last_scraped"] = time.time()
+        if last_insight_timestamp is not None:
+            token["last_insight_timestamp"] = last_insight_timestamp
+            token["last_insight_cursor"] = last_insight_cursor
+
+    async def get_scraper_state(self, key: str):
+        self.round_trips += 1
+        return self.state.get(key)
+
+    async def set_scraper_state(self, key: str, value: str):
+        self.round_trips += 1
+        self.state[key] = value
+
+    async def get_tokens_due_for_scrape(self):
+        self.calls["get_tokens_due_for_scrape"] += 1
+        self.round_trips += 1
+        return list(self.tokens.values())
+
+
+class ParseTimer:
+    """Accumulates time spent in TokenScraper.parse_insights."""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.pages = 0
+
+    def wrap(self, parse):
+        def timed(scraper_self, html, timestamp):
+            start = time.perf_counter()
+            try:
+                return parse(scraper_self, html, timestamp)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.pages += 1
+        return timed
+
+
+async def _no_stealth(page):
+    pass
+
+
+async def _no_jitter(scraper_self):
+    pass
+
+
+class Replay:
+    """
+    Installs the fakes into the scraper module for the duration of a with-block.
+
+        with Replay(Recording.from_fixtures(), token_count=10) as replay:
+            asyncio.run(replay.orchestrator().run_all_due_tokens())
+    """
+
+    def __init__(self, recording: Recording, token_count: Optional[int] = None, workers: int = 1):
+        slugs = recording.tokens
+        token_count = token_count or len(slugs)
+        aliases = {}
+        tokens = []
+        for i in range(token_count):
+            slug = slugs[i % len(slugs)]
+            token_id = slug if token_count <= len(slugs) else f"{slug}-{i}"
+            aliases[token_id] = slug
+            tokens.append({"id": token_id, "name": token_id, "enabled": True, "scrape_interval": 60})
+
+        self.workers = workers
+        self.server = ReplayServer(recording, aliases)
+        self.db = InMemoryDatabase(tokens)
+        self.parse_timer = ParseTimer()
+        self._saved = {}
+
+    def orchestrator(self) -> "scraper.ScraperOrchestrator":
+        return scraper.ScraperOrchestrator(pool=ReplayBrowserPool(self.server))
+
+    def __enter__(self) -> "Replay":
+        patches = {
+            (scraper, "save_insights"): self.db.save_insights,
+            (scraper, "update_token_last_scraped"): self.db.update_token_last_scraped,
+            (scraper, "get_tokens_due_for_scrape"): self.db.get_tokens_due_for_scrape,
+            (scraper, "get_scraper_state"): self.db.get_scraper_state,
+            (scraper, "set_scraper_state"): self.db.set_scraper_state,
+            (scraper, "stealth_async"): _no_stealth,
+            (scraper.TokenScraper, "_human_jitter"): _no_jitter,
+            (scraper.TokenScraper, "parse_insights"): self.parse_timer.wrap(scraper.TokenScraper.parse_insights),
+            # Offline: no pacing, no page-load waits, no disk cache, in-page fetch only
+            (config, "FETCH_MODE"): "browser",
+            (config, "PAGE_CACHE_DIR"): "",
+            (config, "LOCAL_STORE_PATH"): "",
+            (config, "PAGE_LOAD_DELAY_MIN"): 0.0,
+            (config, "PAGE_LOAD_DELAY_MAX"): 0.0,
+            (config, "TOKEN_DELAY_MIN"): 0.0,
+            (config, "TOKEN_DELAY_MAX"): 0.0,
+            (config, "REQUEST_INTERVAL_START"): 1e-6,
+            (config, "REQUEST_INTERVAL_MIN"): 1e-6,
+            (config, "MAX_CONCURRENT_WORKERS"): self.workers,
+            (config, "TOKENS_PER_BATCH"): len(self.db.tokens),
+            (config, "PROXY_LIST"): [f"http://replay-lane-{i}:8080" for i in range(self.workers)],
+            (page_cache, "_page_cache"): None,
+            (local_store, "_local_store"): None,
+            (rate_governor, "_governors"): {},
+        }
+        for (owner, name), value in patches.items():
+            self._saved[(owner, name)] = getattr(owner, name)
+            setattr(owner, name, value)
+        return self
+
+    def __exit__(self, *exc):
+        for (owner, name), value in self._saved.items():
+            setattr(owner, name, value)
+        self._saved.clear()
@@ -4,12 +4,19 @@
 -- =====================================================
 
 -- 1. Tokens Registry Table
+-- If you already have a tokens table, run this ALTER instead:
+-- ALTER TABLE tokens ADD COLUMN IF NOT EXISTS last_insight_timestamp BIGINT;
+-- ALTER TABLE tokens ADD COLUMN IF NOT EXISTS last_insight_cursor TEXT;
+-- ALTER TABLE tokens ADD COLUMN IF NOT EXISTS newest_insight_timestamp BIGINT;
 CREATE TABLE IF NOT EXISTS tokens (
     id TEXT PRIMARY KEY,           -- Token slug (e.g., "bitcoin", "ethereum")
     name TEXT NOT NULL,            -- Display name
     enabled BOOLEAN DEFAULT TRUE,  -- Whether to scrape this token
     scrape_interval INT DEFAULT 60, -- Minutes between scrapes
     last_scraped TIMESTAMPTZ,      -- Last successful scrape time
+    last_insight_timestamp BIGINT, -- High-water mark: newest timeline item fully ingested
+    last_insight_cursor TEXT,      -- Insight cursor of that timeline item
+    newest_insight_timestamp BIGINT, -- Newest insight saved (maintained by rollup_insight_stats)
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -30,8 +37,128 @@ CREATE TABLE IF NOT EXISTS insights (
 );
 
 -- Create index for faster queries by token
+-- Keyset pagination on /news walks (timestamp, id); on an existing database run
+-- DROP INDEX IF EXISTS idx_insights_timestamp; first to add the id tiebreaker.
 CREATE INDEX IF NOT EXISTS idx_insights_token_id ON insights(token_id);
-CREATE INDEX IF NOT EXISTS idx_insights_timestamp ON insights(timestamp DESC);
+CREATE INDEX IF NOT EXISTS idx_insights_timestamp ON insights(timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_insights_token_timestamp ON insights(token_id, timestamp DESC, id DESC);
+-- Insert order, for catching up the API's local read store (local_store.py)
+CREATE INDEX IF NOT EXISTS idx_insights_created_at ON insights(created_at, id);
+
+-- Full-text search (/news/search): title weighted above content, kept up to date by Postgres
+ALTER TABLE insights ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED;
+CREATE INDEX IF NOT EXISTS idx_insights_search ON insights USING GIN(search_vector);
+
+-- Ranked search with optional token and time-range filters, called via rpc
+CREATE OR REPLACE FUNCTION search_insights(
+    q TEXT,
+    p_token_id TEXT DEFAULT NULL,
+    p_since BIGINT DEFAULT NULL,
+    p_until BIGINT DEFAULT NULL,
+    p_limit INT DEFAULT 20,
+    p_offset INT DEFAULT 0
+)
+RETURNS TABLE (
+    id TEXT,
+    token_id TEXT,
+    "timestamp" BIGINT,
+    title TEXT,
+    content TEXT,
+    source_count INT,
+    sources JSONB,
+    created_at TIMESTAMPTZ,
+    rank REAL
+)
+LANGUAGE sql STABLE AS $$
+    SELECT i.id, i.token_id, i.timestamp, i.title, i.content, i.source_count, i.sources, i.created_at,
+           ts_rank_cd(i.search_vector, query) AS rank
+    FROM insights i, websearch_to_tsquery('english', q) AS query
+    WHERE i.search_vector @@ query
+      AND (p_token_id IS NULL OR i.token_id = p_token_id)
+      AND (p_since IS NULL OR i.timestamp >= p_since)
+      AND (p_until IS NULL OR i.timestamp < p_until)
+    ORDER BY rank DESC, i.timestamp DESC, i.id DESC
+    LIMIT p_limit OFFSET p_offset;
+$$;
+
+-- Latest N insights for each of several tokens in one query (/news/batch):
+-- one index walk of idx_insights_token_timestamp per token
+CREATE OR REPLACE FUNCTION latest_insights_per_token(p_token_ids TEXT[], p_per_token INT DEFAULT 5)
+RETURNS TABLE (
+    id TEXT,
+    token_id TEXT,
+    "timestamp" BIGINT,
+    title TEXT,
+    content TEXT,
+    source_count INT,
+    sources JSONB,
+    created_at TIMESTAMPTZ
+)
+LANGUAGE sql STABLE AS $$
+    SELECT i.id, i.token_id, i.timestamp, i.title, i.content, i.source_count, i.sources, i.created_at
+    FROM unnest(p_token_ids) AS t(token_id)
+    CROSS JOIN LATERAL (
+        SELECT * FROM insights
+        WHERE insights.token_id = t.token_id AND insights.timestamp IS NOT NULL  -- as get_news
+        ORDER BY insights.timestamp DESC, insights.id DESC
+        LIMIT p_per_token
+    ) i;
+$$;
+
+-- Per-token, per-day insight aggregates (/tokens/{id}/stats), kept current by a
+-- statement-level trigger on every insert into insights - including bulk upserts,
+-- where only the rows actually inserted are counted.
+-- To backfill an existing database once:
+-- INSERT INTO token_daily_stats (token_id, day, insight_count, source_count, newest_insight_timestamp)
+-- SELECT token_id, (to_timestamp(timestamp / 1000.0) AT TIME ZONE 'UTC')::date, COUNT(*),
+--        COALESCE(SUM(source_count), 0), MAX(timestamp)
+-- FROM insights WHERE token_id IS NOT NULL AND timestamp IS NOT NULL GROUP BY 1, 2;
+-- UPDATE tokens t SET newest_insight_timestamp = s.newest
+-- FROM (SELECT token_id, MAX(newest_insight_timestamp) AS newest FROM token_daily_stats GROUP BY token_id) s
+-- WHERE t.id = s.token_id;
+CREATE TABLE IF NOT EXISTS token_daily_stats (
+    token_id TEXT NOT NULL,
+    day DATE NOT NULL,             -- UTC day of the insight timestamp
+    insight_count INT NOT NULL DEFAULT 0,
+    source_count BIGINT NOT NULL DEFAULT 0,
+    newest_insight_timestamp BIGINT,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (token_id, day)
+);
+
+CREATE OR REPLACE FUNCTION rollup_insight_stats() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO token_daily_stats AS s (token_id, day, insight_count, source_count, newest_insight_timestamp)
+    SELECT token_id, (to_timestamp(timestamp / 1000.0) AT TIME ZONE 'UTC')::date,
+           COUNT(*), COALESCE(SUM(source_count), 0), MAX(timestamp)
+    FROM new_insights
+    WHERE token_id IS NOT NULL AND timestamp IS NOT NULL
+    GROUP BY 1, 2
+    ON CONFLICT (token_id, day) DO UPDATE SET
+        insight_count = s.insight_count + EXCLUDED.insight_count,
+        source_count = s.source_count + EXCLUDED.source_count,
+        newest_insight_timestamp = GREATEST(s.newest_insight_timestamp, EXCLUDED.newest_insight_timestamp),
+        updated_at = NOW();
+
+    UPDATE tokens t
+    SET newest_insight_timestamp = GREATEST(t.newest_insight_timestamp, n.newest)
+    FROM (SELECT token_id, MAX(timestamp) AS newest FROM new_insights GROUP BY token_id) n
+    WHERE t.id = n.token_id;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS insights_rollup_stats ON insights;
+CREATE TRIGGER insights_rollup_stats
+    AFTER INSERT ON insights
+    REFERENCING NEW TABLE AS new_insights
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_insight_stats();
 
 -- 3. Scraper State Table
 CREATE TABLE IF NOT EXISTS scraper_state (
@@ -75,10 +202,155 @@ CREATE TABLE IF NOT EXISTS usage_logs (
     id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
     api_key_id UUID REFERENCES api_keys(id),
     user_address TEXT REFERENCES users(address),
-    endpoint TEXT,
+    endpoint TEXT,                 -- Route template, e.g. /tokens/{token_id}/stats
     status_code INT,
+    latency_ms INT,                -- Time to the response headers
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
+-- If you already have a usage_logs table, run this ALTER instead:
+-- ALTER TABLE usage_logs ADD COLUMN IF NOT EXISTS latency_ms INT;
+
+-- Usage rollups: per user, key, endpoint and status, maintained by rollup_usage_logs
+-- as usage_logs batches are inserted, so /billing/usage never scans the raw logs.
+-- To backfill from existing logs (once, before the trigger sees new inserts):
+-- INSERT INTO usage_hourly (user_address, api_key_id, hour, endpoint, status_code, requests, latency_ms_sum)
+-- SELECT user_address, api_key_id, date_trunc('hour', created_at), COALESCE(endpoint, ''), COALESCE(status_code, 0),
+--        COUNT(*), COALESCE(SUM(latency_ms), 0)
+-- FROM usage_logs WHERE user_address IS NOT NULL AND api_key_id IS NOT NULL
+--   AND created_at > NOW() - INTERVAL '7 days' GROUP BY 1, 2, 3, 4, 5;
+-- INSERT INTO usage_daily (user_address, api_key_id, day, endpoint, status_code, requests, latency_ms_sum)
+-- SELECT user_address, api_key_id, (created_at AT TIME ZONE 'UTC')::date, COALESCE(endpoint, ''), COALESCE(status_code, 0),
+--        COUNT(*), COALESCE(SUM(latency_ms), 0)
+-- FROM usage_logs WHERE user_address IS NOT NULL AND api_key_id IS NOT NULL GROUP BY 1, 2, 3, 4, 5;
+-- INSERT INTO usage_totals (user_address, api_key_id, requests)
+-- SELECT user_address, api_key_id, SUM(requests) FROM usage_daily GROUP BY 1, 2;
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    user_address TEXT NOT NULL,
+    api_key_id UUID NOT NULL,
+    hour TIMESTAMPTZ NOT NULL,     -- date_trunc('hour', created_at)
+    endpoint TEXT NOT NULL,
+    status_code INT NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_address, hour, api_key_id, endpoint, status_code)
+);
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    user_address TEXT NOT NULL,
+    api_key_id UUID NOT NULL,
+    day DATE NOT NULL,             -- UTC day of created_at
+    endpoint TEXT NOT NULL,
+    status_code INT NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    latency_ms_sum BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_address, day, api_key_id, endpoint, status_code)
+);
+
+CREATE TABLE IF NOT EXISTS usage_totals (
+    user_address TEXT NOT NULL,
+    api_key_id UUID NOT NULL,
+    requests BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_address, api_key_id)
+);
+
+CREATE OR REPLACE FUNCTION rollup_usage_logs() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- ORDER BY keeps concurrent flushes from different replicas locking rows in the same order
+    INSERT INTO usage_hourly AS u (user_address, api_key_id, hour, endpoint, status_code, requests, latency_ms_sum)
+    SELECT user_address, api_key_id, date_trunc('hour', created_at), COALESCE(endpoint, ''), COALESCE(status_code, 0),
+           COUNT(*), COALESCE(SUM(latency_ms), 0)
+    FROM new_usage
+    WHERE user_address IS NOT NULL AND api_key_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+    ORDER BY 1, 2, 3, 4, 5
+    ON CONFLICT (user_address, hour, api_key_id, endpoint, status_code) DO UPDATE SET
+        requests = u.requests + EXCLUDED.requests,
+        latency_ms_sum = u.latency_ms_sum + EXCLUDED.latency_ms_sum;
+
+    INSERT INTO usage_daily AS u (user_address, api_key_id, day, endpoint, status_code, requests, latency_ms_sum)
+    SELECT user_address, api_key_id, (created_at AT TIME ZONE 'UTC')::date, COALESCE(endpoint, ''), COALESCE(status_code, 0),
+           COUNT(*), COALESCE(SUM(latency_ms), 0)
+    FROM new_usage
+    WHERE user_address IS NOT NULL AND api_key_id IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5
+    ORDER BY 1, 2, 3, 4, 5
+    ON CONFLICT (user_address, day, api_key_id, endpoint, status_code) DO UPDATE SET
+        requests = u.requests + EXCLUDED.requests,
+        latency_ms_sum = u.latency_ms_sum + EXCLUDED.latency_ms_sum;
+
+    INSERT INTO usage_totals AS u (user_address, api_key_id, requests)
+    SELECT user_address, api_key_id, COUNT(*)
+    FROM new_usage
+    WHERE user_address IS NOT NULL AND api_key_id IS NOT NULL
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+    ON CONFLICT (user_address, api_key_id) DO UPDATE SET requests = u.requests + EXCLUDED.requests;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS usage_logs_rollup ON usage_logs;
+CREATE TRIGGER usage_logs_rollup
+    AFTER INSERT ON usage_logs
+    REFERENCING NEW TABLE AS new_usage
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_usage_logs();
+
+-- /billing/usage: totals, last 24 hours, last 30 days and per-endpoint/per-key breakdowns
+CREATE OR REPLACE FUNCTION usage_summary(p_user_address TEXT)
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    SELECT jsonb_build_object(
+        'total_requests', (SELECT COALESCE(SUM(requests), 0) FROM usage_totals WHERE user_address = lower(p_user_address)),
+        'last_24h', (
+            SELECT COALESCE(SUM(requests), 0) FROM usage_hourly
+            WHERE user_address = lower(p_user_address) AND hour > NOW() - INTERVAL '24 hours'
+        ),
+        'last_30d', (
+            SELECT COALESCE(SUM(requests), 0) FROM usage_daily
+            WHERE user_address = lower(p_user_address) AND day > (NOW() AT TIME ZONE 'UTC')::date - 30
+        ),
+        'endpoints', (
+            SELECT COALESCE(jsonb_agg(e ORDER BY e.requests DESC), '[]'::jsonb) FROM (
+                SELECT endpoint, SUM(requests) AS requests,
+                       COALESCE(SUM(requests) FILTER (WHERE status_code >= 400), 0) AS errors,
+                       ROUND(SUM(latency_ms_sum)::numeric / NULLIF(SUM(requests), 0), 1) AS avg_latency_ms
+                FROM usage_daily
+                WHERE user_address = lower(p_user_address) AND day > (NOW() AT TIME ZONE 'UTC')::date - 30
+                GROUP BY endpoint
+            ) e
+        ),
+        'keys', (
+            SELECT COALESCE(jsonb_agg(jsonb_build_object('api_key_id', api_key_id, 'requests', requests)
+                                      ORDER BY requests DESC), '[]'::jsonb)
+            FROM usage_totals WHERE user_address = lower(p_user_address)
+        ),
+        'plan', (SELECT COALESCE(MAX(plan_type), 'free') FROM credits WHERE user_address = lower(p_user_address))
+    );
+$$;
+
+-- Retention: delete up to p_batch raw logs older than p_keep_days, and hourly rollups older than
+-- p_keep_hourly_days (daily rollups and totals are kept). Returns the raw rows deleted; call it
+-- again while that equals p_batch so each delete stays a short transaction.
+CREATE OR REPLACE FUNCTION prune_usage_logs(p_keep_days INT, p_keep_hourly_days INT, p_batch INT)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    deleted INT;
+BEGIN
+    DELETE FROM usage_logs WHERE id IN (
+        SELECT id FROM usage_logs
+        WHERE created_at < NOW() - make_interval(days => p_keep_days)
+        ORDER BY created_at
+        LIMIT p_batch
+    );
+    GET DIAGNOSTICS deleted = ROW_COUNT;
+
+    DELETE FROM usage_hourly WHERE hour < NOW() - make_interval(days => p_keep_hourly_days);
+    RETURN deleted;
+END;
+$$;
 
 -- 7. Payments History
 CREATE TABLE IF NOT EXISTS payments (
@@ -91,8 +363,87 @@ CREATE TABLE IF NOT EXISTS payments (
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
+-- Atomic credit operations (called via rpc with the service role key).
+-- Each is a single statement/transaction, so concurrent calls cannot lose updates.
+
+-- Deduct if the balance covers it; returns the new balance, or NULL if insufficient
+CREATE OR REPLACE FUNCTION deduct_credits(p_user_address TEXT, p_amount INT DEFAULT 1)
+RETURNS INT
+LANGUAGE sql AS $$
+    UPDATE credits
+    SET balance = balance - p_amount, updated_at = NOW()
+    WHERE user_address = lower(p_user_address) AND balance >= p_amount
+    RETURNING balance;
+$$;
+
+-- Returns the new balance, or NULL if the user has no credits row
+CREATE OR REPLACE FUNCTION add_credits(p_user_address TEXT, p_amount INT)
+RETURNS INT
+LANGUAGE sql AS $$
+    UPDATE credits
+    SET balance = balance + p_amount, updated_at = NOW()
+    WHERE user_address = lower(p_user_address)
+    RETURNING balance;
+$$;
+
+-- Moves up to p_amount credits out of the balance into an API process's local lease
+-- (credit_lease.py); unused credits come back through add_credits. Returns the
+-- number granted, or NULL if the balance is empty.
+CREATE OR REPLACE FUNCTION lease_credits(p_user_address TEXT, p_amount INT)
+RETURNS INT
+LANGUAGE sql AS $$
+    UPDATE credits c
+    SET balance = c.balance - t.granted, updated_at = NOW()
+    FROM (
+        SELECT user_address, LEAST(balance, p_amount) AS granted
+        FROM credits
+        WHERE user_address = lower(p_user_address) AND balance > 0
+        FOR UPDATE
+    ) t
+    WHERE c.user_address = t.user_address
+    RETURNING t.granted;
+$$;
+
+-- Records a confirmed payment and credits the user in one transaction.
+-- Returns the new balance, or NULL if the transaction was already recorded.
+CREATE OR REPLACE FUNCTION record_payment_and_credit(
+    p_tx_hash TEXT,
+    p_user_address TEXT,
+    p_amount_usdc DECIMAL,
+    p_credits INT,
+    p_chain_id INT DEFAULT 8453
+)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    new_balance INT;
+BEGIN
+    INSERT INTO payments (tx_hash, user_address, amount_usdc, credits_added, chain_id, status)
+    VALUES (p_tx_hash, lower(p_user_address), p_amount_usdc, p_credits, p_chain_id, 'confirmed')
+    ON CONFLICT (tx_hash) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+
+    new_balance := add_credits(p_user_address, p_credits);
+    IF new_balance IS NULL THEN
+        RAISE EXCEPTION 'No credits row for %', p_user_address;  -- rolls back the payment row
+    END IF;
+    RETURN new_balance;
+END;
+$$;
+
+-- Billing functions must not be reachable with the public (anon) key
+REVOKE EXECUTE ON FUNCTION deduct_credits(TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION add_credits(TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION lease_credits(TEXT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION record_payment_and_credit(TEXT, TEXT, DECIMAL, INT, INT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION usage_summary(TEXT) FROM PUBLIC, anon, authenticated;
+REVOKE EXECUTE ON FUNCTION prune_usage_logs(INT, INT, INT) FROM PUBLIC, anon, authenticated;
+
 -- Indexes
 CREATE INDEX IF NOT EXISTS idx_api_keys_user ON api_keys(user_address);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys(key_hash);
 CREATE INDEX IF NOT EXISTS idx_usage_user ON usage_logs(user_address);
 CREATE INDEX IF NOT EXISTS idx_usage_created_at ON usage_logs(created_at DESC);
 
@@ -2,11 +2,13 @@
 Multi-token CoinGecko Insights Scraper with anti-blocking strategies.
 """
 import asyncio
+import json
 import logging
 import random
 import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
 from typing import Optional, Dict, List
-from bs4 import BeautifulSoup
 from playwright.async_api import async_playwright, Browser, BrowserContext, Page
 
 # Safe import for playwright-stealth
@@ -21,11 +23,20 @@ except ImportError:
             await Stealth().apply_stealth_async(page)
 
 import config
-from database import (
-    save_insight,
-    insight_exists,
+import http_session
+from broadcaster import news_broadcaster
+from cache import invalidate_token_news, invalidate_tokens
+from http_session import HttpSession, ChallengeError
+from local_store import get_local_store
+from page_cache import TIMELINE_KEY, content_hash, get_page_cache
+from parsers import get_parser
+from rate_governor import get_governor, lane_label
+from async_database import (
+    save_insights,
     update_token_last_scraped,
     get_tokens_due_for_scrape,
+    get_scraper_state,
+    set_scraper_state,
 )
 
 # -------------------------------------------------------------------
@@ -39,26 +50,54 @@ logger = logging.getLogger(__name__)
 
 
 class BrowserPool:
-    """Manages browser instances with proxy rotation."""
+    """
+    Process-wide pool of warm browsers, one per proxy lane.
+    
+    Browsers stay up across scrape runs and are relaunched if they crash;
+    contexts are handed out and recycled after CONTEXT_MAX_USES tokens. In
+    http fetch mode each context keeps one HttpSession for its lifetime, so
+    connections (and HTTP/2) are reused across tokens on the lane.
+    """
     
     def __init__(self):
         self.playwright = None
-        self.browsers: List[Browser] = []
+        self.browsers: Dict[str, Browser] = {}
+        self.idle_contexts: Dict[str, List[BrowserContext]] = {}
+        self.context_uses: Dict[BrowserContext, int] = {}
+        self.http_sessions: Dict[BrowserContext, HttpSession] = {}
         self.proxy_index = 0
+        self._lock = asyncio.Lock()
     
     async def start(self):
-        self.playwright = await async_playwright().start()
-        logger.info("Browser pool started")
+        """Start Playwright once; later calls reuse the running pool."""
+        async with self._lock:
+            if self.playwright:
+                return
+            self.playwright = await async_playwright().start()
+            logger.info("Browser pool started")
     
     async def stop(self):
-        for browser in self.browsers:
-            try:
-                await browser.close()
-            except:
-                pass
-        if self.playwright:
-            await self.playwright.stop()
-        logger.info("Browser pool stopped")
+        async with self._lock:
+            for contexts in self.idle_contexts.values():
+                for context in contexts:
+                    try:
+                        await context.close()
+                    except:
+                        pass
+            for context in list(self.http_sessions):
+                await self.drop_http_session(context)
+            for browser in self.browsers.values():
+                try:
+                    await browser.close()
+                except:
+                    pass
+            self.idle_contexts.clear()
+            self.context_uses.clear()
+            self.browsers.clear()
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
+            logger.info("Browser pool stopped")
     
     def _get_next_proxy(self) -> Optional[str]:
         """Round-robin proxy selection."""
@@ -68,10 +107,24 @@ class BrowserPool:
         self.proxy_index += 1
         return proxy
     
-    async def get_browser(self) -> Browser:
-        """Get or create a browser instance."""
-        proxy = self._get_next_proxy()
-        
+    async def get_browser(self, proxy: Optional[str] = None) -> Browser:
+        """Warm browser for a proxy lane, relaunching it if it has crashed."""
+        lane = proxy or "direct"
+        async with self._lock:
+            browser = self.browsers.get(lane)
+            if browser and browser.is_connected():
+                return browser
+            if browser:
+                logger.warning(f"Browser on lane {lane_label(proxy)} disconnected, relaunching...")
+                for context in self.idle_contexts.pop(lane, []):
+                    self.context_uses.pop(context, None)
+                    await self.drop_http_session(context)
+            
+            browser = await self._launch(proxy)
+            self.browsers[lane] = browser
+            return browser
+    
+    async def _launch(self, proxy: Optional[str]) -> Browser:
         launch_args = [
             "--disable-blink-features=AutomationControlled",
             "--no-sandbox",
@@ -88,9 +141,7 @@ class BrowserPool:
             launch_kwargs["proxy"] = {"server": proxy}
             logger.info(f"Launching browser with proxy: {proxy[:30]}...")
         
-        browser = await self.playwright.chromium.launch(**launch_kwargs)
-        self.browsers.append(browser)
-        return browser
+        return await self.playwright.chromium.launch(**launch_kwargs)
     
     async def create_context(self, browser: Browser) -> BrowserContext:
         """Create a new browser context with stealth settings."""
@@ -101,17 +152,105 @@ class BrowserPool:
             device_scale_factor=random.choice([1, 2]),
         )
         return context
+    
+    async def acquire_context(self, proxy: Optional[str] = None) -> BrowserContext:
+        """Idle context on the lane's browser (keeps its cookies), or a fresh one."""
+        browser = await self.get_browser(proxy)
+        idle = self.idle_contexts.get(proxy or "direct", [])
+        while idle:
+            context = idle.pop()
+            if context.browser is browser:
+                return context
+            self.context_uses.pop(context, None)
+            await self.drop_http_session(context)
+        
+        context = await self.create_context(browser)
+        self.context_uses[context] = 0
+        return context
+    
+    async def release_context(self, context: BrowserContext, proxy: Optional[str] = None, healthy: bool = True):
+        """Return a context to its lane, closing it if it failed or is worn out."""
+        uses = self.context_uses.get(context, 0) + 1
+        browser = self.browsers.get(proxy or "direct")
+        
+        if healthy and uses < config.CONTEXT_MAX_USES and browser and context.browser is browser and browser.is_connected():
+            self.context_uses[context] = uses
+            self.idle_contexts.setdefault(proxy or "direct", []).append(context)
+            return
+        
+        self.context_uses.pop(context, None)
+        await self.drop_http_session(context)
+        try:
+            await context.close()
+        except:
+            pass
+    
+    async def http_session(self, context: BrowserContext, page: Page, proxy: Optional[str] = None) -> HttpSession:
+        """The context's HTTP session (created on first use), refreshed from `page`."""
+        session = self.http_sessions.get(context)
+        if session:
+            await session.refresh(page)
+            return session
+        session = await HttpSession.from_page(page, proxy=proxy)
+        self.http_sessions[context] = session
+        return session
+    
+    async def drop_http_session(self, context: BrowserContext):
+        """Close the context's HTTP session, e.g. after it was challenged."""
+        session = self.http_sessions.pop(context, None)
+        if session:
+            try:
+                await session.close()
+            except:
+                pass
+
+
+# Shared by every orchestrator in the process; stopped from main.lifespan
+browser_pool = BrowserPool()
+
+
+# In-page fetch fallbacks (run inside the token page)
+PAGE_FETCH_JSON = """async (url) => {
+    try {
+        const r = await fetch(url, { headers: {'Accept': 'application/json'} });
+        if (!r.ok) return { success: false, status: r.status };
+        return { success: true, data: await r.json() };
+    } catch (e) {
+        return { success: false, error: e.toString() };
+    }
+}"""
+
+PAGE_FETCH_TEXT = """async (url) => {
+    try {
+        const r = await fetch(url);
+        if (!r.ok) return { success: false, status: r.status };
+        return { success: true, data: await r.text() };
+    } catch (e) {
+        return { success: false, error: e.toString() };
+    }
+}"""
 
 
 class TokenScraper:
     """Scrapes insights for a single token."""
     
-    def __init__(self, token: Dict, context: BrowserContext):
+    def __init__(self, token: Dict, context: BrowserContext, proxy: Optional[str] = None, pool: "BrowserPool" = None):
         self.token = token
         self.token_id = token["id"]
         self.token_name = token.get("name", token["id"])
         self.context = context
+        self.proxy = proxy
+        self.pool = pool or browser_pool
         self.page: Optional[Page] = None
+        self.http: Optional[HttpSession] = None
+        self.governor = get_governor(proxy)
+        self.cache = get_page_cache()
+        self.store = get_local_store()
+        self.initialized = False
+        self.parser = get_parser()
+        self.stats = {"pages": 0, "inserted": 0, "skipped": 0}
+        self.rate_limited = False  # the last insight fetch got a 429
+        self.failures: Optional[Dict[str, list]] = None  # loaded on the first failed fetch
     
     @property
     def base_url(self) -> str:
@@ -125,6 +264,23 @@ class TokenScraper:
         return config.COINGECKO_INSIGHT_URL.format(token_slug=self.token_id, cursor=cursor)
     
     async def initialize(self):
+        """Open the token page and, in http mode, hand its session to an HTTP client."""
+        self.initialized = True
+        await self._open_page()
+        
+        if config.FETCH_MODE != "http" or not http_session.is_available():
+            return
+        try:
+            self.http = await self.pool.http_session(self.context, self.page, proxy=self.proxy)
+        except Exception as e:
+            logger.warning(f"[{self.token_name}] HTTP session setup failed, using in-page fetch: {e}")
+            return
+        
+        # The page is only needed again if the session gets challenged
+        await self.page.close()
+        self.page = None
+    
+    async def _open_page(self):
         """Open page and navigate to token page."""
         self.page = await self.context.new_page()
         await stealth_async(self.page)
@@ -136,11 +292,13 @@ class TokenScraper:
         try:
             await self.page.goto(self.base_url, wait_until="domcontentloaded", timeout=60000)
             await self._human_jitter()
-            await asyncio.sleep(random.uniform(2, 4))
+            await asyncio.sleep(random.uniform(config.PAGE_LOAD_DELAY_MIN, config.PAGE_LOAD_DELAY_MAX))
         except Exception as e:
             logger.warning(f"[{self.token_name}] Navigation warning: {e}")
     
     async def close(self):
+        # The HTTP session belongs to the context and stays open for the next token
+        self.http = None
         if self.page:
             await self.page.close()
     
@@ -157,23 +315,48 @@ class TokenScraper:
         except:
             pass
     
+    async def _fetch(self, url: str, as_json: bool = False) -> Dict:
+        """Fetch through the HTTP session, falling back to the page on a challenge."""
+        # The browser session is only set up once something actually needs the network
+        if not self.initialized:
+            await self.initialize()
+        
+        if self.http:
+            try:
+                return await self.http.fetch(url, as_json=as_json)
+            except ChallengeError as e:
+                logger.warning(f"[{self.token_name}] HTTP session challenged ({e}), falling back to in-page fetch")
+                await self.pool.drop_http_session(self.context)
+                self.http = None
+        
+        if not self.page:
+            await self._open_page()
+        return await self.page.evaluate(PAGE_FETCH_JSON if as_json else PAGE_FETCH_TEXT, url)
+    
     async def fetch_timeline(self) -> List[Dict]:
+        # A timeline fetched moments ago (e.g. before a crash) is still current
+        if self.cache:
+            cached = await asyncio.to_thread(self.cache.get, self.token_id, TIMELINE_KEY, config.TIMELINE_CACHE_TTL)
+            if cached is not None:
+                logger.info(f"[{self.token_name}] Timeline from page cache")
+                return json.loads(cached)
+        
         logger.info(f"[{self.token_name}] Fetching timeline...")
         await self._human_jitter()
         
         try:
-            result = await self.page.evaluate("""async (url) => {
-                try {
-                    const r = await fetch(url, { headers: {'Accept': 'application/json'} });
-                    if (!r.ok) return { success: false, status: r.status };
-                    return { success: true, data: await r.json() };
-                } catch (e) {
-                    return { success: false, error: e.toString() };
-                }
-            }""", self.timeline_api)
+            await self.governor.acquire()
+            result = await self._fetch(self.timeline_api, as_json=True)
             
             if result.get("success"):
-                return result.get("data", [])
+                self.governor.on_success()
+                data = result.get("data", [])
+                if self.cache:
+                    await asyncio.to_thread(self.cache.put, self.token_id, TIMELINE_KEY, json.dumps(data))
+                return data
+            elif result.get("status") == 429:
+                self.governor.on_rate_limited()
+                return []
             else:
                 logger.error(f"[{self.token_name}] Timeline failed: {result}")
                 return []
@@ -181,29 +364,33 @@ class TokenScraper:
             logger.error(f"[{self.token_name}] Timeline exception: {e}")
             return []
     
-    async def fetch_insight_html(self, cursor: str) -> Optional[str]:
+    async def fetch_insight_html(self, cursor: str, timestamp: Optional[int] = None) -> Optional[str]:
+        self.rate_limited = False
+        if self.cache:
+            # Gzip and file I/O run off the event loop (the API shares it)
+            cached = await asyncio.to_thread(self.cache.get, self.token_id, cursor, config.INSIGHT_CACHE_TTL)
+            if cached is not None:
+                logger.info(f"[{self.token_name}] Insight ...{cursor[-8:]} from page cache")
+                return cached
+        
         url = self.insight_url(cursor)
         logger.info(f"[{self.token_name}] Fetching insight ...{cursor[-8:]}")
         
-        delay = random.uniform(config.REQUEST_DELAY_MIN, config.REQUEST_DELAY_MAX)
-        await asyncio.sleep(delay)
+        # Paced by the lane's shared governor instead of a fixed delay
+        await self.governor.acquire()
         
         try:
-            result = await self.page.evaluate("""async (url) => {
-                try {
-                    const r = await fetch(url);
-                    if (!r.ok) return { success: false, status: r.status };
-                    return { success: true, data: await r.text() };
-                } catch (e) {
-                    return { success: false, error: e.toString() };
-                }
-            }""", url)
+            result = await self._fetch(url)
             
             if result.get("success"):
-                return result.get("data")
+                self.governor.on_success()
+                html = result.get("data")
+                if self.cache and html:
+                    await asyncio.to_thread(self.cache.put, self.token_id, cursor, html, timestamp)
+                return html
             elif result.get("status") == 429:
-                logger.warning(f"[{self.token_name}] Rate limited. Backing off {config.RATE_LIMIT_BACKOFF}s...")
-                await asyncio.sleep(config.RATE_LIMIT_BACKOFF)
+                self.governor.on_rate_limited()
+                self.rate_limited = True
                 return None
             else:
                 logger.error(f"[{self.token_name}] Insight failed: {result}")
@@ -212,202 +399,269 @@ class TokenScraper:
             logger.error(f"[{self.token_name}] Insight exception: {e}")
             return None
     
-    def parse_insights(self, html: str, timestamp: int) -> List[Dict]:
-        if not html:
-            return []
-        
-        soup = BeautifulSoup(html, "html.parser")
-        results = []
-        
-        for entry in soup.select(".gecko-timeline-entry"):
+    @property
+    def failures_key(self) -> str:
+        return f"page_failures:{self.token_id}"
+    
+    async def _give_up_on(self, cursor: str, timestamp: Optional[int]) -> bool:
+        """Count a failed fetch of an insight page; True once it has failed PAGE_MAX_FAILURES runs."""
+        if self.failures is None:
+            raw = await get_scraper_state(self.failures_key)
             try:
-                data_url = entry.get("data-url", "")
-                insight_id = data_url.split("/")[-1] if data_url else None
-                if not insight_id:
-                    insight_id = f"gen_{self.token_id}_{timestamp}_{random.randint(1000,9999)}"
-                
-                # Prefix with token_id to ensure uniqueness across tokens
-                full_id = f"{self.token_id}_{insight_id}"
-                
-                content = entry.select_one(".gecko-timeline-entry-content")
-                if not content:
-                    continue
-                
-                title_el = content.select_one(".gecko-insight .tw-font-semibold")
-                body_el = content.select_one(".gecko-insight .tw-font-normal")
-                sources_el = content.select_one(".tw-text-xs.tw-leading-4")
-                
-                title = title_el.get_text(strip=True).rstrip(":") if title_el else ""
-                body = body_el.get_text(strip=True) if body_el else ""
-                
-                # Extract source count
-                source_count = 0
-                if sources_el:
-                    try:
-                        source_count = int(sources_el.get_text(strip=True).split()[0])
-                    except:
-                        pass
-                
-                # Extract source URLs - look for links in the entry
-                sources = []
-                
-                # Try different selectors for source links
-                # Sources are typically in a section with links to news/articles
-                source_links = entry.select("a[href*='http']")
-                for link in source_links:
-                    href = link.get("href", "")
-                    text = link.get_text(strip=True)
-                    
-                    # Skip internal CoinGecko links
-                    if "coingecko.com" in href:
-                        continue
-                    
-                    # Skip empty links
-                    if not href or not text:
-                        continue
-                    
-                    sources.append({
-                        "url": href,
-                        "title": text[:200]  # Limit title length
-                    })
-                
-                # Also check for source indicators/citations
-                source_section = entry.select(".gecko-insight-sources a, .insight-source a, [class*='source'] a")
-                for link in source_section:
-                    href = link.get("href", "")
-                    text = link.get_text(strip=True)
-                    if href and "coingecko.com" not in href:
-                        # Avoid duplicates
-                        if not any(s["url"] == href for s in sources):
-                            sources.append({
-                                "url": href,
-                                "title": text[:200]
-                            })
-                
-                results.append({
-                    "id": full_id,
-                    "token_id": self.token_id,
-                    "timestamp": timestamp,
-                    "title": title,
-                    "content": body,
-                    "source_count": source_count,
-                    "sources": sources,  # Array of {url, title}
-                })
-            except Exception as e:
-                logger.warning(f"[{self.token_name}] Parse error: {e}")
+                self.failures = json.loads(raw) if raw else {}
+            except ValueError:
+                self.failures = {}
+        count = self.failures.get(cursor, [0])[0] + 1
+        self.failures[cursor] = [count, timestamp]
+        if count < config.PAGE_MAX_FAILURES:
+            return False
+        logger.warning(
+            f"[{self.token_name}] Insight ...{cursor[-8:]} failed {count} runs in a row, "
+            f"moving the high-water mark past it"
+        )
+        return True
+    
+    async def _save_failures(self, high_water_mark: Optional[Dict]):
+        if self.failures is None:
+            return
+        # Cursors at or behind the mark are never fetched again
+        mark = (high_water_mark or {}).get("timestamp") or self.token.get("last_insight_timestamp") or 0
+        self.failures = {cursor: entry for cursor, entry in self.failures.items() if (entry[1] or 0) > mark}
+        await set_scraper_state(self.failures_key, json.dumps(self.failures))
+    
+    def parse_insights(self, html: str, timestamp: int) -> List[Dict]:
+        return self.parser.parse(html, self.token_id, timestamp)
+    
+    def _new_timeline_items(self, timeline: List[Dict]) -> List[Dict]:
+        """Timeline items newer than the token's high-water mark, oldest first."""
+        items = [item for item in timeline if item.get("latest_insight_cursor")]
+        items.sort(key=lambda x: x.get("timestamp") or 0)
         
+        hwm_timestamp = self.token.get("last_insight_timestamp")
+        hwm_cursor = self.token.get("last_insight_cursor")
+        if hwm_timestamp is None:
+            return items
         
-        return results
+        # A timeline bucket at the mark is only new if its cursor moved on
+        return [
+            item for item in items
+            if (item.get("timestamp") or 0) > hwm_timestamp
+            or (item.get("timestamp") == hwm_timestamp and item["latest_insight_cursor"] != hwm_cursor)
+        ]
     
-    async def scrape(self) -> int:
-        """Run the full scraping flow for this token. Returns count of new insights."""
-        await self.initialize()
-        inserted = 0
-        
+    def _publish_new_insights(self, rows: List[Dict]):
+        """Tell the API read path about freshly saved rows: local store, /news cache, streams."""
+        newest = max((row.get("timestamp") or 0 for row in rows), default=0)
+        if newest > (self.token.get("newest_insight_timestamp") or 0):
+            # Mirrors the rollup trigger in Supabase, for the local store's /tokens
+            self.token["newest_insight_timestamp"] = newest
+        if self.store:
+            self.store.add_insights(rows)
+        invalidate_token_news(self.token_id)
+        news_broadcaster.publish(rows)
+    
+    async def scrape(self) -> Dict[str, int]:
+        """Run the full scraping flow for this token. Returns page/inserted/skipped counts."""
         try:
             timeline = await self.fetch_timeline()
             if not timeline:
                 logger.warning(f"[{self.token_name}] Empty timeline")
-                return 0
+                return self.stats
+            
+            items = self._new_timeline_items(timeline)
+            logger.info(f"[{self.token_name}] {len(items)} new timeline items since last run")
             
-            timeline.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
+            # Advance the mark only over a contiguous run of fully ingested items (or
+            # pages given up on after PAGE_MAX_FAILURES runs, so one dead page can't pin it)
+            high_water_mark = None
+            caught_up = True
             
-            for item in timeline:
-                cursor = item.get("latest_insight_cursor")
+            for item in items:
+                cursor = item["latest_insight_cursor"]
                 timestamp = item.get("timestamp")
-                if not cursor:
+                
+                html = await self.fetch_insight_html(cursor, timestamp)
+                if html is None:
+                    # A 429 says nothing about the page itself
+                    if self.rate_limited or not await self._give_up_on(cursor, timestamp):
+                        caught_up = False
+                    elif caught_up:
+                        high_water_mark = item
+                    continue
+                
+                self.stats["pages"] += 1
+                digest = content_hash(html)
+                if self.cache and await asyncio.to_thread(self.cache.is_ingested, self.token_id, cursor, digest):
+                    # Identical page already parsed and saved
+                    if caught_up:
+                        high_water_mark = item
                     continue
                 
-                html = await self.fetch_insight_html(cursor)
                 insights = self.parse_insights(html, timestamp)
                 
-                for insight in insights:
-                    if insight_exists(insight["id"]):
-                        continue
-                    save_insight(insight)
-                    inserted += 1
+                new_rows = await save_insights(insights)
+                if new_rows is None:
+                    caught_up = False
+                else:
+                    self.stats["inserted"] += len(new_rows)
+                    self.stats["skipped"] += len(insights) - len(new_rows)
+                    if new_rows:
+                        self._publish_new_insights(new_rows)
+                    if self.cache:
+                        await asyncio.to_thread(self.cache.mark_ingested, self.token_id, cursor, digest)
+                
+                if caught_up:
+                    high_water_mark = item
             
-            update_token_last_scraped(self.token_id)
-            logger.info(f"[{self.token_name}] Done. New insights: {inserted}")
+            if high_water_mark:
+                # Keep the caller's token dict current for the next run
+                self.token["last_insight_timestamp"] = high_water_mark.get("timestamp")
+                self.token["last_insight_cursor"] = high_water_mark["latest_insight_cursor"]
+                await update_token_last_scraped(
+                    self.token_id,
+                    last_insight_timestamp=high_water_mark.get("timestamp"),
+                    last_insight_cursor=high_water_mark["latest_insight_cursor"],
+                )
+            else:
+                await update_token_last_scraped(self.token_id)
+            invalidate_tokens()  # last_scraped / the mark changed
+            await self._save_failures(high_water_mark)
+            if self.store:
+                self.token["last_scraped"] = datetime.now(timezone.utc).isoformat()
+                self.store.put_token(self.token)
+            logger.info(
+                f"[{self.token_name}] Done. New insights: {self.stats['inserted']} "
+                f"(skipped {self.stats['skipped']} existing)"
+            )
             
         finally:
             await self.close()
         
-        return inserted
+        return self.stats
 
 
 class ScraperOrchestrator:
     """Orchestrates scraping across multiple tokens with rate limiting."""
     
-    def __init__(self):
-        self.pool = BrowserPool()
-        self.rate_limit_backoff = config.RATE_LIMIT_BACKOFF_INITIAL
+    def __init__(self, pool: Optional[BrowserPool] = None):
+        self.pool = pool or browser_pool
+        # Per-lane pacing: one token at a time per egress IP/proxy
+        self.lane_locks: Dict[str, asyncio.Lock] = {}
+        self.lane_next_start: Dict[str, float] = {}
+        self.totals = {"tokens": 0, "failed": 0, "pages": 0, "inserted": 0, "skipped": 0}
     
     async def run_all_due_tokens(self):
         """Scrape tokens that are due, respecting batch limits."""
         logger.info("Starting orchestrated scrape run...")
+        self.totals = dict.fromkeys(self.totals, 0)
         await self.pool.start()
         
-        try:
-            all_due_tokens = get_tokens_due_for_scrape()
-            if not all_due_tokens:
-                logger.info("No tokens due for scraping")
-                return
-            
-            # Batch limit: only process N tokens per run
-            tokens = all_due_tokens[:config.TOKENS_PER_BATCH]
-            remaining = len(all_due_tokens) - len(tokens)
-            
-            logger.info(f"Processing {len(tokens)} tokens this batch ({remaining} queued for next run)")
-            
-            # Sequential processing is safer without proxies
-            browser = await self.pool.get_browser()
+        all_due_tokens = await get_tokens_due_for_scrape()
+        if not all_due_tokens:
+            logger.info("No tokens due for scraping")
+            return
+        
+        # Workers on the same proxy lane serialize on its lock, so more workers than lanes gain nothing
+        lanes = max(1, len(config.PROXY_LIST))
+        num_workers = max(1, min(config.MAX_CONCURRENT_WORKERS, lanes, len(all_due_tokens)))
+        
+        # Batch limit: N tokens per worker per run
+        tokens = all_due_tokens[:config.TOKENS_PER_BATCH * num_workers]
+        remaining = len(all_due_tokens) - len(tokens)
+        
+        logger.info(
+            f"Processing {len(tokens)} tokens this batch on {num_workers} workers "
+            f"({remaining} queued for next run)"
+        )
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        for token in tokens:
+            queue.put_nowait(token)
+        
+        workers = [
+            asyncio.create_task(self._worker(worker_id, queue, len(tokens)))
+            for worker_id in range(num_workers)
+        ]
+        await asyncio.gather(*workers)
+        
+        cache = get_page_cache()
+        if cache:
+            await asyncio.to_thread(cache.evict)
+        
+        logger.info(
+            f"Batch complete: {self.totals['tokens']} tokens ({self.totals['failed']} failed), "
+            f"{self.totals['pages']} pages, {self.totals['inserted']} new insights, "
+            f"{self.totals['skipped']} skipped"
+        )
+    
+    async def _worker(self, worker_id: int, queue: asyncio.Queue, total: int):
+        """Drain the token queue on a pooled browser and proxy lane."""
+        proxy = self.pool._get_next_proxy()
+        
+        while True:
+            try:
+                token = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
             
-            for i, token in enumerate(tokens):
-                logger.info(f"[{i+1}/{len(tokens)}] Starting {token['name']}...")
-                
-                context = await self.pool.create_context(browser)
-                
-                try:
-                    scraper = TokenScraper(token, context)
-                    await scraper.scrape()
-                    # Reset backoff on success
-                    self.rate_limit_backoff = config.RATE_LIMIT_BACKOFF_INITIAL
-                except Exception as e:
-                    logger.error(f"Error scraping {token['id']}: {e}")
-                    if config.SKIP_ON_FAILURE:
-                        logger.info(f"Skipping {token['id']} and continuing...")
-                    else:
-                        raise
-                finally:
-                    await context.close()
-                
-                # Delay between tokens (important for avoiding blocks)
-                if i < len(tokens) - 1:
-                    delay = random.uniform(config.TOKEN_DELAY_MIN, config.TOKEN_DELAY_MAX)
-                    logger.info(f"Waiting {delay:.0f}s before next token...")
-                    await asyncio.sleep(delay)
+            position = total - queue.qsize()
+            await self.scrape_token(token, proxy, worker_id, f"[{position}/{total}] ")
+    
+    async def scrape_token(self, token: Dict, proxy: Optional[str], worker_id: int = 0, label: str = ""):
+        """Scrape one token on a proxy lane, honouring the lane's pacing."""
+        async with self._lane(proxy or "direct", worker_id):
+            logger.info(f"[worker {worker_id}] {label}Starting {token['name']}...")
             
-        finally:
-            await self.pool.stop()
-        
-        logger.info("Batch complete")
+            context = await self.pool.acquire_context(proxy)
+            healthy = False
+            try:
+                scraper = TokenScraper(token, context, proxy=proxy, pool=self.pool)
+                stats = await scraper.scrape()
+                healthy = True
+                self.totals["tokens"] += 1
+                for key, value in stats.items():
+                    self.totals[key] += value
+            except Exception as e:
+                self.totals["failed"] += 1
+                logger.error(f"Error scraping {token['id']}: {e}")
+                if config.SKIP_ON_FAILURE:
+                    logger.info(f"Skipping {token['id']} and continuing...")
+                else:
+                    raise
+            finally:
+                await self.pool.release_context(context, proxy, healthy=healthy)
+    
+    @asynccontextmanager
+    async def _lane(self, lane: str, worker_id: int):
+        """Hold a proxy lane for one token, then space the next token on it."""
+        lock = self.lane_locks.setdefault(lane, asyncio.Lock())
+        async with lock:
+            # Delay between tokens on the same lane (important for avoiding blocks)
+            delay = self.lane_next_start.get(lane, 0) - time.monotonic()
+            if delay > 0:
+                logger.info(f"[worker {worker_id}] Waiting {delay:.0f}s before next token...")
+                await asyncio.sleep(delay)
+            try:
+                yield
+            finally:
+                self.lane_next_start[lane] = time.monotonic() + random.uniform(
+                    config.TOKEN_DELAY_MIN, config.TOKEN_DELAY_MAX
+                )
     
     async def scrape_single_token(self, token_id: str):
         """Scrape a single token by ID."""
         await self.pool.start()
         
+        proxy = self.pool._get_next_proxy()
+        context = await self.pool.acquire_context(proxy)
+        healthy = False
         try:
-            browser = await self.pool.get_browser()
-            context = await self.pool.create_context(browser)
-            
             token = {"id": token_id, "name": token_id}
-            scraper = TokenScraper(token, context)
+            scraper = TokenScraper(token, context, proxy=proxy, pool=self.pool)
             await scraper.scrape()
-            
-            await context.close()
+            healthy = True
         finally:
-            await self.pool.stop()
+            await self.pool.release_context(context, proxy, healthy=healthy)
 
 
 # -------------------------------------------------------------------
@@ -416,7 +670,10 @@ class ScraperOrchestrator:
 async def main():
     """Run a full scrape of all due tokens."""
     orchestrator = ScraperOrchestrator()
-    await orchestrator.run_all_due_tokens()
+    try:
+        await orchestrator.run_all_due_tokens()
+    finally:
+        await browser_pool.stop()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,38 @@
+"""
+JSON encoding for API responses: orjson when installed, stdlib json otherwise.
+
+Cached /news pages are encoded once when they enter the cache and served as
+bytes afterwards, so a cache hit costs no serialization at all.
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class for the app (see dumps)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def raw_json(body: bytes, headers=None) -> Response:
+    """Response for an already encoded JSON body."""
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def join_object(members: dict) -> bytes:
+    """Encode {key: already-encoded JSON bytes} as one JSON object without re-encoding the values."""
+    return b"{" + b",".join(dumps(key) + b":" + body for key, body in members.items()) + b"}"
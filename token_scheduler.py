@@ -0,0 +1,160 @@
+"""
+Deadline-driven token scheduler.
+
+Tokens sit in a priority queue ordered by their next due time and are
+dispatched to long-lived scraper workers as soon as their own
+scrape_interval expires, instead of in hourly batches. A token is never
+queued or scraped twice at the same time (single-flight), however many
+triggers fire.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from async_database import get_all_tokens
+from scraper import ScraperOrchestrator
+
+logger = logging.getLogger(__name__)
+
+
+def _last_scraped_epoch(token: Dict) -> Optional[float]:
+    last_scraped = token.get("last_scraped")
+    if not last_scraped:
+        return None
+    if isinstance(last_scraped, str):
+        last_scraped = datetime.fromisoformat(last_scraped.replace("Z", "+00:00"))
+    return last_scraped.timestamp()
+
+
+def _interval_seconds(token: Dict) -> float:
+    return (token.get("scrape_interval") or config.DEFAULT_SCRAPE_INTERVAL_MINUTES) * 60
+
+
+class TokenScheduler:
+    """Priority queue of tokens by next-due time feeding a pool of scraper workers."""
+
+    def __init__(self, orchestrator: Optional[ScraperOrchestrator] = None):
+        self.orchestrator = orchestrator or ScraperOrchestrator()
+        self.tokens: Dict[str, Dict] = {}
+        self.next_due: Dict[str, float] = {}        # authoritative; heap entries are lazily invalidated
+        self.heap: List[Tuple[float, str]] = []
+        self.in_flight: Set[str] = set()            # queued or being scraped
+        self.ready: asyncio.Queue = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        await self.orchestrator.pool.start()
+        await self.refresh()
+        # Workers sharing a proxy lane would only queue on its lock
+        workers = max(1, min(config.MAX_CONCURRENT_WORKERS, len(config.PROXY_LIST) or 1))
+        self._tasks = [asyncio.create_task(self._dispatch_loop())] + [
+            asyncio.create_task(self._worker(worker_id, self.orchestrator.pool._get_next_proxy()))
+            for worker_id in range(workers)
+        ]
+        logger.info(f"Token scheduler started with {len(self.tokens)} tokens on {workers} workers")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Token scheduler stopped")
+
+    async def refresh(self):
+        """Reload the enabled-token registry and (re)schedule new or changed tokens."""
+        try:
+            tokens = await get_all_tokens(True, raise_errors=True)
+        except Exception:
+            return  # keep the current schedule; an empty answer here would unschedule everything
+        fresh = {token["id"]: token for token in tokens}
+        now = time.time()
+
+        for token_id in list(self.tokens):
+            if token_id not in fresh:
+                # Disabled or deleted: its heap entries are skipped from now on
+                del self.tokens[token_id]
+                self.next_due.pop(token_id, None)
+
+        for token_id, token in fresh.items():
+            known = self.tokens.get(token_id)
+            self.tokens[token_id] = token
+            if token_id in self.in_flight:
+                continue
+            if known and token_id in self.next_due and known.get("scrape_interval") == token.get("scrape_interval"):
+                continue
+            last_scraped = _last_scraped_epoch(token)
+            due = now if last_scraped is None else max(now, last_scraped + _interval_seconds(token))
+            self._schedule(token_id, due)
+
+    def _schedule(self, token_id: str, due: float):
+        self.next_due[token_id] = due
+        heapq.heappush(self.heap, (due, token_id))
+        self._wakeup.set()
+
+    def trigger(self, token_ids: Optional[List[str]] = None) -> int:
+        """Make tokens due now (all by default), skipping ones in flight. Returns how many."""
+        now = time.time()
+        triggered = 0
+        for token_id in token_ids or list(self.tokens):
+            if token_id in self.tokens and token_id not in self.in_flight:
+                self._schedule(token_id, now)
+                triggered += 1
+        return triggered
+
+    async def _dispatch_loop(self):
+        while True:
+            now = time.time()
+            while self.heap and self.heap[0][0] <= now:
+                due, token_id = heapq.heappop(self.heap)
+                if self.next_due.get(token_id) != due or token_id in self.in_flight:
+                    continue  # stale entry, removed token, or already running
+                self.in_flight.add(token_id)
+                self.ready.put_nowait(self.tokens[token_id])
+
+            self._wakeup.clear()
+            timeout = self.heap[0][0] - now if self.heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self, worker_id: int, proxy: Optional[str]):
+        while True:
+            token = await self.ready.get()
+            if token["id"] not in self.tokens:
+                # Disabled or deleted while it was waiting
+                self.in_flight.discard(token["id"])
+                continue
+            try:
+                await self.orchestrator.scrape_token(token, proxy, worker_id)
+            except Exception as e:
+                logger.error(f"[worker {worker_id}] Scrape of {token['id']} failed: {e}")
+            finally:
+                self.in_flight.discard(token["id"])
+                if token["id"] in self.tokens:
+                    self._schedule(token["id"], time.time() + _interval_seconds(self.tokens[token["id"]]))
+
+    def snapshot(self) -> Dict:
+        upcoming = sorted((due, token_id) for token_id, due in self.next_due.items() if token_id not in self.in_flight)
+        return {
+            "running": self.running,
+            "tokens": len(self.tokens),
+            "in_flight": sorted(self.in_flight),
+            "queued": self.ready.qsize(),
+            "next_due": [
+                {"token_id": token_id, "in_seconds": round(max(0.0, due - time.time()))}
+                for due, token_id in upcoming[:5]
+            ],
+            "totals": dict(self.orchestrator.totals),
+        }
@@ -0,0 +1,265 @@
+"""
+Buffered usage logging for authenticated API calls.
+
+verify_api_key marks the request with the caller's key (request.state.api_key)
+and UsageLogMiddleware records the call once the response has started, with
+the real status code and latency. Rows go into a bounded in-memory queue that
+a background task writes to usage_logs with multi-row inserts - as soon as
+USAGE_LOG_BATCH rows are waiting, otherwise every USAGE_LOG_FLUSH_MS - so no
+request waits on a log write.
+
+When the queue is full, or the database can't be reached, rows are appended to
+a JSONL spill file (USAGE_LOG_SPILL_PATH) and replayed once inserts succeed
+again; without a spill path they are dropped and counted. File writes happen
+in a worker thread from the flusher task: rows that arrive while the queue is
+full wait in a second bounded buffer, and past that are dropped. A batch the database
+rejects (e.g. a row for an API key deleted while other replicas still had it
+cached) is split in halves until the offending rows are isolated; those go to
+USAGE_LOG_REJECTED_PATH instead of being retried, and the rest is written.
+main.lifespan flushes the queue on shutdown.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import config
+from async_database import log_api_usage_batch
+
+logger = logging.getLogger(__name__)
+
+# A spill file is replayed at most this often
+SPILL_REPLAY_SECONDS = 30.0
+
+# SQLSTATE classes no retry can fix: data exceptions (22) and integrity violations (23)
+REJECTED_SQLSTATE_CLASSES = ("22", "23")
+
+
+def is_rejection(error: Exception) -> bool:
+    """True if the database refused the rows themselves, rather than being unreachable."""
+    code = getattr(error, "code", None)
+    return isinstance(code, str) and code[:2] in REJECTED_SQLSTATE_CLASSES
+
+
+class UsageLogger:
+    def __init__(self):
+        self.rows: deque = deque()
+        self.overflow: deque = deque()  # rows to spill, set aside by record() when the queue is full
+        self._batch_ready = asyncio.Event()
+        self._task = None
+        self._closing = False
+        self._last_replay = 0.0
+        self.healthy = True  # the last insert succeeded
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.failed_batches = 0
+
+    def record(self, api_key_id: str, user_address: str, endpoint: str, status_code: int, latency_ms: int):
+        row = {
+            "api_key_id": api_key_id,
+            "user_address": user_address,
+            "endpoint": endpoint,
+            "status_code": status_code,
+            "latency_ms": latency_ms,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if len(self.rows) >= config.USAGE_LOG_QUEUE_SIZE:
+            # No file I/O here: this runs on the event loop for every request
+            if len(self.overflow) >= config.USAGE_LOG_QUEUE_SIZE:
+                self.dropped += 1
+            else:
+                self.overflow.append(row)
+                self._batch_ready.set()
+            return
+        self.rows.append(row)
+        if len(self.rows) >= config.USAGE_LOG_BATCH:
+            self._batch_ready.set()
+
+    # ---------------------------------------------------------------
+    # Flushing
+    # ---------------------------------------------------------------
+    def start(self):
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._batch_ready.wait(), config.USAGE_LOG_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._batch_ready.clear()
+            try:
+                await self.spill_overflow()
+                await self.flush()
+                if self.healthy and time.monotonic() - self._last_replay > SPILL_REPLAY_SECONDS:
+                    await self.replay_spill()
+            except Exception as e:
+                logger.error(f"Usage log flush failed: {e}")
+
+    async def flush(self):
+        """Write everything queued, one insert per USAGE_LOG_BATCH rows."""
+        while self.rows:
+            batch = [self.rows.popleft() for _ in range(min(len(self.rows), config.USAGE_LOG_BATCH))]
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict]) -> int:
+        """Insert a batch; spill it if the database is unreachable. Returns the rows written."""
+        try:
+            await log_api_usage_batch(batch)
+        except Exception as e:
+            if not is_rejection(e):
+                logger.error(f"Error logging usage ({len(batch)} rows): {e}")
+                self.healthy = False
+                self.failed_batches += 1
+                await asyncio.to_thread(self._spill, batch)
+                return 0
+            if len(batch) == 1:
+                logger.warning(f"Usage log row rejected: {e}")
+                await asyncio.to_thread(self._reject, batch[0], e)
+                return 0
+            # Bisect to find the rejected rows; the others still go in
+            middle = len(batch) // 2
+            return await self._write(batch[:middle]) + await self._write(batch[middle:])
+        self.healthy = True
+        self.written += len(batch)
+        return len(batch)
+
+    async def stop(self):
+        """Stop the flusher and write what is still queued (called from main.lifespan)."""
+        self._closing = True
+        self._batch_ready.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.spill_overflow()
+        await self.flush()
+        if self.rows:
+            self._spill(list(self.rows))
+            self.rows.clear()
+
+    # ---------------------------------------------------------------
+    # Spill file
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _append(path: str, rows: List[Dict]) -> bool:
+        if not path:
+            return False
+        try:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a") as f:
+                f.writelines(json.dumps(row) + "\n" for row in rows)
+            return True
+        except OSError as e:
+            logger.error(f"Could not write usage logs to {path}: {e}")
+            return False
+
+    def _spill(self, rows: List[Dict]):
+        if self._append(config.USAGE_LOG_SPILL_PATH, rows):
+            self.spilled += len(rows)
+        else:
+            self.dropped += len(rows)
+
+    async def spill_overflow(self):
+        """Spill the rows record() set aside, in one append off the event loop."""
+        if not self.overflow:
+            return
+        rows = list(self.overflow)
+        self.overflow.clear()
+        await asyncio.to_thread(self._spill, rows)
+
+    def _reject(self, row: Dict, error: Exception):
+        """Set a row the database refused aside (never replayed), with the reason."""
+        self.rejected += 1
+        self._append(config.USAGE_LOG_REJECTED_PATH, [{**row, "error": str(error)}])
+
+    async def replay_spill(self) -> int:
+        """Insert rows from the spill file. Rows the database still can't take are spilled to a fresh file."""
+        self._last_replay = time.monotonic()
+        if not config.USAGE_LOG_SPILL_PATH:
+            return 0
+        path = Path(config.USAGE_LOG_SPILL_PATH)
+        replaying = path.with_name(path.name + ".replay")
+        try:
+            # A leftover .replay file is from a run that stopped halfway; finish it first
+            if not replaying.exists():
+                path.replace(replaying)
+        except FileNotFoundError:
+            return 0
+
+        replayed = 0
+        batch = []
+        with open(replaying) as f:
+            for line in f:
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    continue  # torn write
+                if len(batch) >= config.USAGE_LOG_BATCH:
+                    replayed += await self._write(batch)
+                    batch = []
+            if batch:
+                replayed += await self._write(batch)
+        replaying.unlink()
+        if replayed:
+            logger.info(f"Replayed {replayed} spilled usage log rows")
+        return replayed
+
+    def stats(self) -> Dict:
+        return {
+            "queued": len(self.rows),
+            "overflow": len(self.overflow),
+            "written": self.written,
+            "spilled": self.spilled,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+        }
+
+
+usage_logger = UsageLogger()
+
+
+class UsageLogMiddleware:
+    """Log calls that verify_api_key authenticated, with their final status and latency."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # request.state writes into this dict, so the key is visible here afterwards
+        state = scope.setdefault("state", {})
+        start = time.perf_counter()
+        response = {"status": 500, "latency_ms": None}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["latency_ms"] = round((time.perf_counter() - start) * 1000)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            key_data = state.get("api_key")
+            if key_data:
+                # The route template (/tokens/{token_id}/stats), not the raw path
+                route = scope.get("route")
+                usage_logger.record(
+                    key_data["id"],
+                    key_data["user_address"],
+                    getattr(route, "path", scope["path"]),
+                    response["status"],
+                    response["latency_ms"] if response["latency_ms"] is not None
+                    else round((time.perf_counter() - start) * 1000),
+                )